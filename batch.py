@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from cache import hash_file
+from errors import is_error_result
+
+STAGES = ("text", "entities", "sentiment", "terms", "tables")
+
+
+def iter_pdf_paths(inputs, file_list=None):
+    """
+    Yields PDF paths from files and directories (walked recursively) and an optional file list.
+    """
+    paths = list(inputs)
+    if file_list:
+        with open(file_list, encoding="utf-8") as f:
+            paths.extend(line.strip() for line in f if line.strip())
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def load_manifest(path):
+    """
+    Returns the set of document hashes already recorded as completed.
+    """
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.split("\t", 1)[0].strip() for line in f if line.strip()}
+
+
+def _check(result):
+    if is_error_result(result):
+        raise RuntimeError(result)
+    return result
+
+
+def analyze_file(path, doc_hash, stages, top_terms=50, include_text=False):
+    """
+    Runs the selected analysis stages on one PDF and returns a JSON-serializable record.
+    """
+    from document import parse_pdf
+    from utils import analyze_sentiment, compute_term_statistics, extract_entities, extract_tables_from_pdf
+
+    document = parse_pdf(path, doc_hash=doc_hash, workers=1)
+
+    record = {"path": path, "sha256": doc_hash, "pages": document.page_count, "metadata": document.metadata, "errors": {}}
+    text = document.text()
+    record["chars"] = len(text)
+    if include_text and "text" in stages:
+        record["text"] = text
+
+    stage_runs = {
+        "entities": lambda: _check(extract_entities(document)).astype(object).to_dict(orient="records"),
+        "sentiment": lambda: _check(analyze_sentiment(document)),
+        "terms": lambda: _check(compute_term_statistics(document)).top_k(top_terms),
+        "tables": lambda: [
+            {"page": table.attrs["page"], "bbox": table.attrs["bbox"], **table.astype(object).where(table.notna(), None).to_dict(orient="split", index=False)}
+            for table in _check(extract_tables_from_pdf(document))
+        ],
+    }
+    for stage, run in stage_runs.items():
+        if stage not in stages:
+            continue
+        try:
+            record[stage] = run()
+        except Exception as e:
+            record["errors"][stage] = str(e)
+    return record
+
+
+class JsonlWriter:
+    """
+    Appends one JSON record per line, flushing after each record. write and close return
+    the records that are now safely on disk.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=str) + "\n")
+        self.file.flush()
+        return [record]
+
+    def close(self):
+        self.file.close()
+        return []
+
+
+class ParquetWriter:
+    """
+    Writes each batch of records as its own complete part file under the output
+    directory, so a crash loses only the batch still in memory. write and close return
+    the records whose part file has been written. Nested fields are stored as JSON
+    strings so every part shares one schema.
+    """
+
+    def __init__(self, directory, batch_size=100):
+        import pyarrow  # noqa: F401  (fail early when the optional dependency is missing)
+        os.makedirs(directory, exist_ok=True)
+        self.prefix = os.path.join(directory, f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        self.batch_size = batch_size
+        self.rows = []
+        self.parts = 0
+
+    def write(self, record):
+        self.rows.append({
+            key: value if isinstance(value, (str, int, float)) or value is None else json.dumps(value, default=str)
+            for key, value in record.items()
+        })
+        if len(self.rows) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self.rows:
+            return []
+        columns = ["path", "sha256", "pages", "chars", "text", "metadata", "errors", *STAGES[1:]]
+        table = pa.Table.from_pylist(self.rows, schema=pa.schema([
+            (name, pa.int64() if name in ("pages", "chars") else pa.string()) for name in columns
+        ]))
+        path = f"{self.prefix}-{self.parts:05d}.parquet"
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self.parts += 1
+        written, self.rows = self.rows, []
+        return written
+
+    def close(self):
+        return self.flush()
+
+
+def run_batch(paths, out, fmt="jsonl", workers=None, manifest=None, stages=STAGES, top_terms=50, include_text=False):
+    """
+    Analyzes PDFs across a process pool, writing each record as soon as it completes. A
+    hash is appended to the manifest once its record is on disk, so an interrupted run
+    can resume. Returns throughput totals.
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest = manifest or f"{out.rstrip(os.sep)}.manifest"
+    completed = load_manifest(manifest)
+    writer = ParquetWriter(out) if fmt == "parquet" else JsonlWriter(out)
+    totals = {"documents": 0, "pages": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+
+    def report():
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        logging.info(
+            f"{totals['documents']} docs ({totals['documents'] / elapsed:.2f}/s), "
+            f"{totals['pages']} pages ({totals['pages'] / elapsed:.1f}/s), "
+            f"{totals['skipped']} skipped, {totals['failed']} failed"
+        )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(manifest, "a", encoding="utf-8") as manifest_file:
+        pending = {}
+        queued = set()
+
+        def mark_written(records):
+            for record in records:
+                manifest_file.write(f"{record['sha256']}\t{record['path']}\n")
+            manifest_file.flush()
+
+        def collect(done):
+            for future in done:
+                path, doc_hash = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logging.error(f"Error analyzing {path}: {e}")
+                    totals["failed"] += 1
+                    continue
+                mark_written(writer.write(record))
+                completed.add(doc_hash)
+                totals["documents"] += 1
+                totals["pages"] += record["pages"]
+                if totals["documents"] % 10 == 0:
+                    report()
+
+        try:
+            for path in paths:
+                try:
+                    doc_hash = hash_file(path)
+                except OSError as e:
+                    logging.error(f"Error reading {path}: {e}")
+                    totals["failed"] += 1
+                    continue
+                if doc_hash in completed or doc_hash in queued:
+                    totals["skipped"] += 1
+                    continue
+                future = pool.submit(analyze_file, path, doc_hash, tuple(stages), top_terms, include_text)
+                pending[future] = (path, doc_hash)
+                queued.add(doc_hash)
+                if len(pending) >= workers * 4:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        finally:
+            mark_written(writer.close())
+
+    elapsed = time.perf_counter() - started
+    report()
+    totals["seconds"] = elapsed
+    totals["documents_per_second"] = totals["documents"] / elapsed if elapsed else 0.0
+    totals["pages_per_second"] = totals["pages"] / elapsed if elapsed else 0.0
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze directories of PDFs without the Streamlit UI.")
+    parser.add_argument("inputs", nargs="*", help="PDF files or directories to analyze")
+    parser.add_argument("--file-list", help="text file with one PDF path per line")
+    parser.add_argument("--out", required=True, help="output .jsonl file, or output directory for parquet")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--manifest", help="completed-hash manifest (default: <out>.manifest)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--top-terms", type=int, default=50, help="number of top terms to record")
+    parser.add_argument("--include-text", action="store_true", help="store the extracted text in each record")
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.file_list:
+        parser.error("provide at least one input path or --file-list")
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    totals = run_batch(
+        iter_pdf_paths(args.inputs, args.file_list), args.out, fmt=args.format, workers=args.workers,
+        manifest=args.manifest, stages=stages, top_terms=args.top_terms, include_text=args.include_text
+    )
+    print(json.dumps(totals))
+    return 0 if not totals["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
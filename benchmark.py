@@ -0,0 +1,247 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from errors import is_error_result
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "benchmark")
+SIZES = (10, 100, 1000)
+FUNCTIONS = (
+    "extract_text_from_pdf",
+    "extract_tables_from_pdf",
+    "extract_entities",
+    "analyze_sentiment",
+    "plot_word_frequency",
+    "generate_wordcloud",
+)
+
+NAMES = ["Marie Curie", "Linus Pauling", "Rosalind Franklin", "Dmitri Mendeleev", "Ada Yonath", "Fritz Haber"]
+PLACES = ["Paris", "Cambridge", "Basel", "Berkeley", "Tokyo", "Heidelberg"]
+ORGS = ["BASF", "Pfizer", "the Max Planck Institute", "MIT", "Novartis", "CERN"]
+WORDS = (
+    "catalyst polymer synthesis reaction yield solvent temperature pressure enzyme compound "
+    "molecule crystal spectrum sample assay protocol buffer ligand oxidation reduction "
+    "kinetics equilibrium concentration titration filtration purity stability toxicity"
+).split()
+OPINIONS = ["excellent", "poor", "promising", "disappointing", "remarkable", "unstable", "safe", "harmful"]
+
+
+def _sentence(rng):
+    words = rng.sample(WORDS, rng.randint(6, 12))
+    words.insert(rng.randrange(len(words)), rng.choice(OPINIONS))
+    sentence = " ".join(words).capitalize()
+    if rng.random() < 0.5:
+        sentence += f", reported by {rng.choice(NAMES)} at {rng.choice(ORGS)} in {rng.choice(PLACES)}"
+    if rng.random() < 0.3:
+        sentence += f" on {rng.randint(1, 28)} March {rng.randint(1950, 2024)}"
+    return sentence + "."
+
+
+def _draw_table(c, rng, x, y, rows=5, cols=4, cell_width=110, cell_height=18):
+    for row in range(rows + 1):
+        c.line(x, y - row * cell_height, x + cols * cell_width, y - row * cell_height)
+    for col in range(cols + 1):
+        c.line(x + col * cell_width, y, x + col * cell_width, y - rows * cell_height)
+    for col, header in enumerate(["Sample", "Yield (%)", "Temp (C)", "Purity"]):
+        c.drawString(x + col * cell_width + 4, y - cell_height + 5, header)
+    for row in range(1, rows):
+        values = [f"S-{rng.randint(100, 999)}", f"{rng.uniform(10, 99):.1f}", str(rng.randint(20, 300)), f"{rng.uniform(0.8, 1):.3f}"]
+        for col, value in enumerate(values):
+            c.drawString(x + col * cell_width + 4, y - (row + 1) * cell_height + 5, value)
+    return y - rows * cell_height
+
+
+def make_synthetic_pdf(pages, tables=False, seed=0):
+    """
+    Builds a deterministic PDF of the given page count: seeded prose with people,
+    organizations, places, dates and opinion words, plus a ruled table on every page
+    when tables is True. invariant=1 keeps the bytes identical between runs.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(f"{seed}:{pages}:{tables}")
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    width, height = letter
+    for page in range(pages):
+        c.setFont("Helvetica", 10)
+        y = height - 50
+        c.drawString(50, y, f"Section {page + 1}: Experimental results")
+        y -= 20
+        if tables:
+            y = _draw_table(c, rng, 50, y) - 20
+        text_object = c.beginText(50, y)
+        text_object.setFont("Helvetica", 10)
+        while text_object.getY() > 60:
+            line = _sentence(rng)
+            while line and text_object.getY() > 60:
+                text_object.textLine(line[:95])
+                line = line[95:]
+        c.drawText(text_object)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def load_corpus(corpus_dir, pages, tables):
+    """
+    Returns the bytes of a synthetic PDF, generating and storing it on first use.
+    """
+    path = os.path.join(corpus_dir, f"synthetic_{pages}p{'_tables' if tables else ''}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        data = make_synthetic_pdf(pages, tables)
+        with open(path, "wb") as f:
+            f.write(data)
+        return data
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def measure(func, repeat):
+    """
+    Times func repeat times, then runs it once more under tracemalloc for the peak
+    Python heap allocation. Returns a result dict; a utils error result marks a failure.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+        if is_error_result(result):
+            return {"status": "error", "error": result}
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "status": "ok",
+        "seconds_min": min(timings),
+        "seconds_median": statistics.median(timings),
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(sizes=SIZES, functions=FUNCTIONS, repeat=3, corpus_dir=DEFAULT_CORPUS_DIR):
+    """
+    Runs every selected utils function on each synthetic corpus and returns the results.
+    Chart render caches are cleared before each call so repeats measure real work.
+    """
+    import utils
+    from charts import clear_render_cache
+
+    results = []
+    for pages in sizes:
+        for tables in (False, True):
+            data = load_corpus(corpus_dir, pages, tables)
+            text = utils.extract_text_from_pdf(data)
+
+            def word_frequency():
+                clear_render_cache()
+                return utils.plot_word_frequency(text)
+
+            calls = {
+                "extract_text_from_pdf": lambda: utils.extract_text_from_pdf(data),
+                "extract_tables_from_pdf": lambda: utils.extract_tables_from_pdf(data),
+                "extract_entities": lambda: utils.extract_entities(text),
+                "analyze_sentiment": lambda: utils.analyze_sentiment(text),
+                "plot_word_frequency": word_frequency,
+                "generate_wordcloud": lambda: utils.generate_wordcloud(text),
+            }
+            for name in functions:
+                case = f"{name}[pages={pages},tables={int(tables)}]"
+                logging.info(f"Running {case}")
+                result = measure(calls[name], repeat)
+                result.update({"case": case, "function": name, "pages": pages, "tables": tables, "bytes": len(data)})
+                results.append(result)
+                if result["status"] == "ok":
+                    logging.info(f"{case}: {result['seconds_min']:.3f}s, peak {result['peak_bytes'] / 1e6:.1f} MB")
+                else:
+                    logging.warning(f"{case}: {result['error']}")
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    Compares a report with a baseline report. Returns (rows, regressions): one row per
+    case present in both, and the rows whose time or peak memory grew by more than
+    threshold (a fraction) or that fail now but succeeded in the baseline.
+    """
+    baseline_results = {result["case"]: result for result in baseline["results"] if result["status"] == "ok"}
+    rows = []
+    regressions = []
+    for result in report["results"]:
+        before = baseline_results.get(result["case"])
+        if before is None:
+            continue
+        if result["status"] != "ok":
+            row = {"case": result["case"], "seconds_before": before["seconds_min"], "seconds_after": float("nan"),
+                   "time_ratio": float("inf"), "memory_ratio": float("inf")}
+            rows.append(row)
+            regressions.append(row)
+            continue
+        row = {
+            "case": result["case"],
+            "seconds_before": before["seconds_min"],
+            "seconds_after": result["seconds_min"],
+            "time_ratio": result["seconds_min"] / max(before["seconds_min"], 1e-9),
+            "memory_ratio": result["peak_bytes"] / max(before["peak_bytes"], 1),
+        }
+        rows.append(row)
+        if row["time_ratio"] > 1 + threshold or row["memory_ratio"] > 1 + threshold:
+            regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the utils.py analysis functions on synthetic PDFs.")
+    parser.add_argument("--out", default="benchmark.json", help="JSON file for the results")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated page counts")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS), help=f"comma-separated subset of {','.join(FUNCTIONS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (the minimum is reported)")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="where the synthetic PDFs are stored")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown or memory growth as a fraction")
+    args = parser.parse_args(argv)
+
+    functions = [name.strip() for name in args.functions.split(",") if name.strip()]
+    unknown = set(functions) - set(FUNCTIONS)
+    if unknown:
+        parser.error(f"unknown functions: {', '.join(sorted(unknown))}")
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = run_benchmarks(sizes, functions, args.repeat, args.corpus_dir)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows, regressions = compare(report, baseline, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row in regressions else "ok"
+        print(f"{row['case']:<55} {row['seconds_before']:9.3f}s -> {row['seconds_after']:9.3f}s "
+              f"x{row['time_ratio']:.2f} mem x{row['memory_ratio']:.2f} {flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
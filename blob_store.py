@@ -0,0 +1,208 @@
+import concurrent.futures
+import functools
+import io
+import json
+import logging
+import mmap
+import os
+import pickle
+import threading
+from spool import stream_to_file
+
+DEFAULT_BLOB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "blobs")
+PREVIEW_CHARS = 3000
+PREVIEW_ROWS = 50
+PREVIEW_IMAGE_SIZE = 800
+
+PREVIEW_KINDS = {
+    "application/pdf": "pdf",
+    "text/plain": "text",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "image/jpeg": "image",
+    "image/png": "image",
+}
+
+
+def preview_kind(mime):
+    """
+    Returns the preview kind for a MIME type, or None when it has no preview.
+    """
+    return PREVIEW_KINDS.get(mime)
+
+
+def _pdf_preview(path):
+    import fitz
+    with fitz.open(path) as pdf:
+        page = pdf[0]
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(1.5, 1.5))
+        return {"image": pixmap.tobytes("png"), "text": page.get_text()[:PREVIEW_CHARS], "pages": pdf.page_count}
+
+
+def _text_preview(path):
+    if os.path.getsize(path) == 0:
+        return {"text": ""}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        return {"text": view[:PREVIEW_CHARS * 4].decode("utf-8", errors="replace")[:PREVIEW_CHARS]}
+
+
+def _docx_preview(path):
+    from docx import Document
+    paragraphs = []
+    size = 0
+    for paragraph in Document(path).paragraphs:
+        paragraphs.append(paragraph.text)
+        size += len(paragraph.text) + 1
+        if size >= PREVIEW_CHARS:
+            break
+    return {"text": "\n".join(paragraphs)[:PREVIEW_CHARS]}
+
+
+def _xlsx_preview(path):
+    import pandas as pd
+    return {"table": pd.read_excel(path, nrows=PREVIEW_ROWS)}
+
+
+def _image_preview(path):
+    from PIL import Image
+    with Image.open(path) as image:
+        image.thumbnail((PREVIEW_IMAGE_SIZE, PREVIEW_IMAGE_SIZE))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+    return {"image": buffer.getvalue()}
+
+
+PREVIEW_BUILDERS = {
+    "pdf": _pdf_preview,
+    "text": _text_preview,
+    "docx": _docx_preview,
+    "xlsx": _xlsx_preview,
+    "image": _image_preview,
+}
+
+
+class BlobStore:
+    """
+    Disk-backed, deduplicated file store keyed by the SHA-256 of the content. Uploads
+    are streamed to disk in chunks while hashing, so the same file is stored once no
+    matter how often it is shared. Previews are built by a background thread pool and
+    pickled next to the blob, so each one is generated only once.
+    """
+
+    def __init__(self, root, preview_workers=2):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=preview_workers, thread_name_prefix="blob-preview")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _meta_path(self, digest):
+        return f"{self.path(digest)}.json"
+
+    def _preview_path(self, digest):
+        return f"{self.path(digest)}.preview"
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, fileobj, name=None, mime=None):
+        """
+        Streams fileobj into the store and returns the content hash. An existing blob
+        with the same content is kept and the new copy discarded.
+        """
+        tmp_path, digest = stream_to_file(fileobj, self.root)
+        try:
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+            if self.exists(digest):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, self.path(digest))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if not os.path.exists(self._meta_path(digest)):
+            with open(self._meta_path(digest), "w") as f:
+                json.dump({"name": name, "mime": mime, "size": os.path.getsize(self.path(digest))}, f)
+        return digest
+
+    def metadata(self, digest):
+        """
+        Returns the name, MIME type and size recorded when the blob was first stored.
+        """
+        with open(self._meta_path(digest)) as f:
+            return json.load(f)
+
+    def _build_preview(self, digest, kind):
+        try:
+            preview = PREVIEW_BUILDERS[kind](self.path(digest))
+        except Exception as e:
+            logging.error(f"Error building {kind} preview for {digest}: {e}")
+            with self._lock:
+                self._pending.pop(digest, None)
+            return {"error": f"Error building preview: {e}"}
+        tmp_path = f"{self._preview_path(digest)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(preview, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._preview_path(digest))
+        with self._lock:
+            self._pending.pop(digest, None)
+        return preview
+
+    def _cached_preview(self, digest):
+        try:
+            with open(self._preview_path(digest), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def request_preview(self, digest, kind):
+        """
+        Schedules building the preview of a blob unless it is cached or already queued.
+        Returns a Future for the preview dict.
+        """
+        with self._lock:
+            future = self._pending.get(digest)
+            if future is None:
+                future = self._executor.submit(self._preview_or_build, digest, kind)
+                self._pending[digest] = future
+            return future
+
+    def _preview_or_build(self, digest, kind):
+        preview = self._cached_preview(digest)
+        if preview is None:
+            return self._build_preview(digest, kind)
+        with self._lock:
+            self._pending.pop(digest, None)
+        return preview
+
+    def preview(self, digest, kind, wait=0):
+        """
+        Returns the cached preview dict of a blob, scheduling it if needed and waiting up
+        to wait seconds for it. Returns None while it is still being built.
+        """
+        preview = self._cached_preview(digest)
+        if preview is not None:
+            return preview
+        future = self.request_preview(digest, kind)
+        try:
+            return future.result(timeout=wait)
+        except concurrent.futures.TimeoutError:
+            return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_blob_store(root=None):
+    """
+    Returns the process-wide blob store at root, GENIE_BLOB_DIR or data/blobs.
+    """
+    return BlobStore(
+        root or os.getenv("GENIE_BLOB_DIR", DEFAULT_BLOB_DIR),
+        preview_workers=int(os.getenv("GENIE_PREVIEW_WORKERS", "2")),
+    )
@@ -0,0 +1,340 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from errors import is_error_result
+from metrics import record_cache
+
+
+def hash_bytes(data):
+    """
+    Returns the SHA-256 hex digest of the given bytes.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Returns the SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(doc_hash, stage, **params):
+    """
+    Builds a cache key from a document hash, a pipeline stage name and the stage parameters.
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{doc_hash}:{stage}:{payload}".encode()).hexdigest()
+
+
+def approx_size(value):
+    """
+    Returns the approximate memory held by a cached value in bytes: memory_size() for
+    objects that report it, nbytes for arrays, deep memory usage for DataFrames and the
+    summed sizes of list, tuple and dict items.
+    """
+    if hasattr(value, "memory_size"):
+        return value.memory_size()
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Two-tier result cache: an in-memory LRU tier and an optional on-disk tier
+    with size-based eviction of the least recently used entries. When ttl (seconds)
+    is set, entries older than that are treated as misses.
+    """
+
+    def __init__(self, max_items=128, disk_dir=None, disk_max_bytes=512 * 1024 * 1024, ttl=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {}
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def _record(self, stage, outcome):
+        stage_stats = self._stats.setdefault(stage, {"hits": 0, "disk_hits": 0, "misses": 0})
+        stage_stats[outcome] += 1
+        record_cache(stage, outcome)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _expired(self, entry):
+        expires_at, _ = entry
+        return expires_at is not None and expires_at < time.time()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            if self._expired(entry):
+                self._remove_disk(path)
+                return False, None
+            os.utime(path)
+            return True, entry
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logging.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove_disk(path)
+            return False, None
+
+    def _remove_disk(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._disk_bytes -= size
+        except OSError:
+            pass
+
+    def _write_disk(self, key, entry):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            if size > self.disk_max_bytes:
+                os.remove(tmp_path)
+                return
+            if os.path.exists(path):
+                self._remove_disk(path)
+            os.replace(tmp_path, path)
+            self._disk_bytes += size
+        except Exception as e:
+            logging.warning(f"Could not write cache entry {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self.disk_max_bytes:
+            return
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        for path, _, _ in entries:
+            if self._disk_bytes <= self.disk_max_bytes:
+                break
+            self._remove_disk(path)
+
+    def get(self, key, stage="default"):
+        """
+        Looks up a key, returning a (hit, value) tuple.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry):
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._record(stage, "hits")
+                return True, entry[1]
+            if self.disk_dir:
+                found, entry = self._read_disk(key)
+                if found:
+                    self._remember(key, entry)
+                    self._record(stage, "disk_hits")
+                    return True, entry[1]
+            self._record(stage, "misses")
+            return False, None
+
+    def set(self, key, value, persist=True):
+        """
+        Stores a value in memory and, when persist is set and a disk tier is configured, on disk.
+        """
+        entry = (time.time() + self.ttl if self.ttl else None, value)
+        with self._lock:
+            self._remember(key, entry)
+            if persist and self.disk_dir:
+                self._write_disk(key, entry)
+
+    def lookup(self, stage, doc_hash, **params):
+        """
+        Looks up a pipeline stage result, returning a (hit, value) tuple.
+        """
+        return self.get(make_key(doc_hash, stage, **params), stage=stage)
+
+    def store(self, stage, doc_hash, value, persist=True, **params):
+        """
+        Stores a pipeline stage result unless it is an error result.
+        """
+        if not is_error_result(value):
+            self.set(make_key(doc_hash, stage, **params), value, persist=persist)
+
+    def get_or_compute(self, stage, doc_hash, compute, persist=True, **params):
+        """
+        Returns the cached result for a pipeline stage, computing and storing it on a miss.
+        Error results are returned but never cached.
+        """
+        found, value = self.lookup(stage, doc_hash, **params)
+        if found:
+            return value
+        value = compute()
+        self.store(stage, doc_hash, value, persist=persist, **params)
+        return value
+
+    def discard(self, keys):
+        """
+        Drops the given keys from the memory tier; disk entries stay.
+        """
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+
+    def stats(self):
+        """
+        Returns per-stage hit/miss counters plus overall totals and tier sizes.
+        """
+        with self._lock:
+            stages = {stage: dict(counts) for stage, counts in self._stats.items()}
+            hits = sum(s["hits"] + s["disk_hits"] for s in stages.values())
+            misses = sum(s["misses"] for s in stages.values())
+            lookups = hits + misses
+            return {
+                "stages": stages,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes if self.disk_dir else 0,
+            }
+
+    def clear(self):
+        """
+        Drops every entry from both tiers and resets the statistics.
+        """
+        with self._lock:
+            self._memory.clear()
+            self._stats.clear()
+            if self.disk_dir:
+                for path, _, _ in self._disk_entries():
+                    self._remove_disk(path)
+                self._disk_bytes = 0
+
+
+class SessionCache:
+    """
+    One session's view of the shared result cache. Every result the session stores is
+    charged to its SessionBudget under the document hash. When the budget is exceeded,
+    the session's least recently used documents are dropped from memory, but only the
+    entries this session stored. A result that does not fit is returned uncached.
+    """
+
+    def __init__(self, cache, budget):
+        self.cache = cache
+        self.budget = budget
+        self._lock = threading.Lock()
+
+    def lookup(self, stage, doc_hash, **params):
+        """
+        Looks up a pipeline stage result, returning a (hit, value) tuple.
+        """
+        found, value = self.cache.lookup(stage, doc_hash, **params)
+        if found:
+            with self._lock:
+                self.budget.touch(doc_hash)
+        return found, value
+
+    def store(self, stage, doc_hash, value, persist=True, **params):
+        """
+        Charges a stage result to the budget and stores it if it fits. Storing the same
+        key again re-measures it. Returns True when the result is cached; error results
+        never are.
+        """
+        if is_error_result(value):
+            return False
+        key = make_key(doc_hash, stage, **params)
+        with self._lock:
+            admitted, evicted = self.budget.charge(doc_hash, key, approx_size(value))
+        self.cache.discard(evicted)
+        if admitted:
+            self.cache.set(key, value, persist=persist)
+        return admitted
+
+    def get_or_compute(self, stage, doc_hash, compute, persist=True, **params):
+        """
+        Returns the cached result for a pipeline stage, computing and storing it on a miss.
+        """
+        found, value = self.lookup(stage, doc_hash, **params)
+        if found:
+            return value
+        value = compute()
+        self.store(stage, doc_hash, value, persist=persist, **params)
+        return value
+
+    def stats(self):
+        """
+        Returns the shared cache statistics plus this session's budget usage.
+        """
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update({"session_bytes": self.budget.used_bytes, "session_limit_bytes": self.budget.limit_bytes})
+        return stats
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Returns the process-wide result cache, configured from the environment:
+    GENIE_CACHE_MAX_ITEMS, GENIE_CACHE_DIR (enables the disk tier) and GENIE_CACHE_MAX_MB.
+    """
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                max_items=int(os.getenv("GENIE_CACHE_MAX_ITEMS", "128")),
+                disk_dir=os.getenv("GENIE_CACHE_DIR") or None,
+                disk_max_bytes=int(os.getenv("GENIE_CACHE_MAX_MB", "512")) * 1024 * 1024,
+            )
+        return _result_cache
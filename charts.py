@@ -0,0 +1,100 @@
+import io
+import json
+import os
+from cache import ResultCache, hash_bytes, make_key
+
+# Charts are drawn on standalone Figure objects with their own Agg canvas instead of
+# the pyplot state machine, so concurrent Streamlit sessions never share a figure.
+_render_cache = ResultCache(max_items=int(os.getenv("GENIE_CHART_CACHE_SIZE", "64")))
+
+
+def data_hash(data):
+    """
+    Hashes chart input data: DataFrames by content, everything else via its JSON form.
+    """
+    if hasattr(data, "columns"):
+        import pandas as pd
+        frame_hash = pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes()
+        return hash_bytes(frame_hash + json.dumps(list(map(str, data.columns))).encode())
+    return hash_bytes(json.dumps(data, sort_keys=True, default=str).encode())
+
+
+def build_figure(draw, data, figsize, dpi=100):
+    """
+    Creates a Figure on a private Agg canvas and lets draw(ax, data) fill its single axes.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    draw(figure.subplots(), data)
+    figure.tight_layout()
+    return figure
+
+
+def render_chart(name, data, draw, figsize=(8, 4), dpi=100, output="png"):
+    """
+    Renders a chart as PNG bytes, served from a render cache keyed by the data hash and
+    size, or as a new Figure the caller owns when output="figure".
+    """
+    if output == "figure":
+        return build_figure(draw, data, figsize, dpi)
+    if output != "png":
+        raise ValueError(f"Unknown chart output: {output}")
+
+    key = make_key(data_hash(data), name, figsize=figsize, dpi=dpi)
+    found, png = _render_cache.get(key, stage=f"chart:{name}")
+    if found:
+        return png
+    buffer = io.BytesIO()
+    build_figure(draw, data, figsize, dpi).savefig(buffer, format="png")
+    png = buffer.getvalue()
+    _render_cache.set(key, png)
+    return png
+
+
+def render_cache_stats():
+    """
+    Returns hit/miss statistics of the chart render cache.
+    """
+    return _render_cache.stats()
+
+
+def clear_render_cache():
+    """
+    Drops every cached chart rendering.
+    """
+    _render_cache.clear()
+
+
+def draw_sentiment_scores(ax, sentiment_scores):
+    labels = ['Positive', 'Negative', 'Neutral']
+    scores = [sentiment_scores.get('pos', 0), sentiment_scores.get('neg', 0), sentiment_scores.get('neu', 0)]
+    ax.bar(labels, scores, color=['green', 'red', 'gray'])
+    ax.set_title('Sentiment Analysis')
+    ax.set_xlabel('Sentiment')
+    ax.set_ylabel('Score')
+
+
+def draw_sentiment_distribution(ax, per_page):
+    colors = ['green' if score >= 0 else 'red' for score in per_page['compound']]
+    ax.bar(per_page['page'], per_page['compound'], color=colors, alpha=0.6, label='Compound')
+    ax.plot(per_page['page'], per_page['pos'], color='green', label='Positive')
+    ax.plot(per_page['page'], per_page['neg'], color='red', label='Negative')
+    ax.axhline(0, color='gray', linewidth=0.8)
+    ax.set_title('Sentiment by Page')
+    ax.set_xlabel('Page')
+    ax.set_ylabel('Score')
+    ax.legend()
+
+
+def draw_word_frequency(ax, word_freq):
+    import seaborn as sns
+    # Plain barh with a viridis palette looks like sns.barplot(palette=...) but needs
+    # neither hue/legend= (seaborn >= 0.13) nor the palette-without-hue form it deprecates.
+    ax.barh(word_freq['word'], word_freq['count'], color=sns.color_palette('viridis', len(word_freq)))
+    ax.invert_yaxis()
+    ax.set_title('Word Frequency')
+    ax.set_xlabel('Count')
+    ax.set_ylabel('Word')
@@ -0,0 +1,274 @@
+import datetime
+import functools
+import io
+import json
+import logging
+import os
+import re
+import threading
+from sqlite_store import SQLiteStore
+from text_index import tokenize
+
+DEFAULT_CHAT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "chat.sqlite3")
+AVATAR_SIZE = 64
+MENTION_PATTERN = re.compile(r"(?<![\w@])@([\w.-]+)")
+
+
+def parse_mentions(message):
+    """
+    Returns the distinct user names mentioned as @name in message, in order, without
+    trailing punctuation (so "@ana." and "@ana," both mention "ana").
+    """
+    mentions = []
+    for match in MENTION_PATTERN.finditer(message):
+        name = match.group(1).rstrip(".-")
+        if name and name not in mentions:
+            mentions.append(name)
+    return mentions
+
+def make_thumbnail(image_bytes, size=AVATAR_SIZE):
+    """
+    Downscales an uploaded image to a PNG thumbnail of at most size x size pixels.
+    Returns None if the bytes are not a readable image.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.thumbnail((size, size))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+    except Exception as e:
+        logging.warning(f"Could not create avatar thumbnail: {e}")
+        return None
+    return buffer.getvalue()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    message TEXT NOT NULL,
+    mentions TEXT NOT NULL DEFAULT '[]',
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    avatar BLOB,
+    email TEXT,
+    joined_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_user ON messages (user, id);
+CREATE TABLE IF NOT EXISTS message_mentions (
+    mention TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (mention, message_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS message_tokens (
+    token TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (token, message_id)
+) WITHOUT ROWID;
+"""
+
+
+class ChatStore(SQLiteStore):
+    """
+    Chat messages and user profiles shared by every session. Message ids increase monotonically and serve as
+    sync cursors: clients only fetch messages newer than the last id they have seen.
+
+    Mentions (case-folded) and body tokens are indexed in the same transaction as each
+    message, and authors through an index on (user, id), so filtering and search touch
+    only matching rows.
+    """
+
+    def __init__(self, path):
+        self._avatars = {}
+        self._avatars_lock = threading.Lock()
+        super().__init__(path, SCHEMA)
+
+    @staticmethod
+    def _message(row):
+        return {
+            "id": row["id"],
+            "user": row["user"],
+            "message": row["message"],
+            "mentions": json.loads(row["mentions"]),
+            "timestamp": row["timestamp"],
+        }
+
+    @staticmethod
+    def _index_message(conn, message_id, message, mentions):
+        conn.executemany(
+            "INSERT OR IGNORE INTO message_mentions (mention, message_id) VALUES (?, ?)",
+            [(mention.lower(), message_id) for mention in mentions]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO message_tokens (token, message_id) VALUES (?, ?)",
+            [(token, message_id) for token in set(tokenize(message))]
+        )
+
+    def post_message(self, user, message, mentions=None, timestamp=None):
+        """
+        Appends a message, indexes it and returns its id. Mentions are parsed from the
+        message unless given.
+        """
+        if mentions is None:
+            mentions = parse_mentions(message)
+        timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (user, message, mentions, timestamp) VALUES (?, ?, ?, ?)",
+                (user, message, json.dumps(list(mentions)), timestamp)
+            )
+            self._index_message(conn, cursor.lastrowid, message, mentions)
+            return cursor.lastrowid
+
+    def search(self, mention=None, author=None, query=None, before_id=None, limit=20):
+        """
+        Returns (messages, next_cursor): up to limit messages, newest first, that mention
+        the given user, were written by author and contain every word of query. Pass
+        next_cursor back as before_id for the next page; it is None after the last page.
+        """
+        conditions = ["id < ?"]
+        params = [before_id if before_id is not None else self.latest_id() + 1]
+        if mention:
+            conditions.append("id IN (SELECT message_id FROM message_mentions WHERE mention = ?)")
+            params.append(mention.lstrip("@").lower())
+        if author:
+            conditions.append("user = ?")
+            params.append(author)
+        for token in dict.fromkeys(tokenize(query or "")):
+            conditions.append("id IN (SELECT message_id FROM message_tokens WHERE token = ?)")
+            params.append(token)
+        rows = self._connection().execute(
+            "SELECT id, user, message, mentions, timestamp FROM messages "
+            f"WHERE {' AND '.join(conditions)} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        messages = [self._message(row) for row in rows[:limit]]
+        next_cursor = messages[-1]["id"] if len(rows) > limit else None
+        return messages, next_cursor
+
+    def fetch_since(self, cursor=0, limit=500):
+        """
+        Returns up to limit messages with an id greater than cursor, oldest first.
+        """
+        rows = self._connection().execute(
+            "SELECT id, user, message, mentions, timestamp FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+            (cursor, limit)
+        ).fetchall()
+        return [self._message(row) for row in rows]
+
+    def fetch_before(self, before_id=None, limit=50):
+        """
+        Returns up to limit messages older than before_id (the newest ones when before_id
+        is None), oldest first. Used to page backwards through the history.
+        """
+        if before_id is None:
+            before_id = self.latest_id() + 1
+        rows = self._connection().execute(
+            "SELECT id, user, message, mentions, timestamp FROM messages WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (before_id, limit)
+        ).fetchall()
+        return [self._message(row) for row in reversed(rows)]
+
+    def iter_messages(self, batch_size=1000):
+        """
+        Yields every message in id order, reading in batches.
+        """
+        cursor = 0
+        while True:
+            batch = self.fetch_since(cursor, batch_size)
+            if not batch:
+                return
+            yield from batch
+            cursor = batch[-1]["id"]
+
+    def latest_id(self):
+        """
+        Returns the id of the newest message, or 0 when there are none.
+        """
+        return self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def add_user(self, name):
+        """
+        Registers a user if they are not known yet.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (name, joined_at) VALUES (?, ?)",
+                (name, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+
+    def list_users(self):
+        """
+        Returns every registered user name, in join order.
+        """
+        return [row[0] for row in self._connection().execute("SELECT name FROM users ORDER BY joined_at, name")]
+
+    def set_avatar(self, name, avatar):
+        """
+        Stores a downscaled PNG thumbnail of a user's avatar image. Returns False if the
+        image could not be read.
+        """
+        thumbnail = make_thumbnail(avatar)
+        if thumbnail is None:
+            return False
+        with self._transaction() as conn:
+            conn.execute("UPDATE users SET avatar = ? WHERE name = ?", (thumbnail, name))
+        with self._avatars_lock:
+            self._avatars[name] = thumbnail
+        return True
+
+    def set_email(self, name, email):
+        """
+        Stores the address a user is notified at when mentioned. An address that is
+        already registered is never replaced; returns False when the user has a
+        different one.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE users SET email = ? WHERE name = ? AND (email IS NULL OR email = ?)",
+                (email, name, email)
+            )
+        return cursor.rowcount > 0
+
+    def get_emails(self, names):
+        """
+        Returns {name: email} for the given user names (matched case-insensitively) that
+        have an address.
+        """
+        names = list(names)
+        if not names:
+            return {}
+        placeholders = ", ".join("?" * len(names))
+        rows = self._connection().execute(
+            f"SELECT name, email FROM users WHERE email IS NOT NULL AND name COLLATE NOCASE IN ({placeholders})",
+            names
+        ).fetchall()
+        return {row["name"]: row["email"] for row in rows}
+
+    def get_avatar(self, name):
+        """
+        Returns a user's avatar thumbnail bytes, or None. Thumbnails are read from the
+        database once and then served from memory.
+        """
+        with self._avatars_lock:
+            if name in self._avatars:
+                return self._avatars[name]
+        row = self._connection().execute("SELECT avatar FROM users WHERE name = ?", (name,)).fetchone()
+        avatar = row[0] if row else None
+        with self._avatars_lock:
+            self._avatars[name] = avatar
+        return avatar
+
+
+@functools.lru_cache(maxsize=None)
+def get_chat_store(path=None):
+    """
+    Returns the process-wide chat store at path, GENIE_CHAT_DB or data/chat.sqlite3.
+    """
+    return ChatStore(path or os.getenv("GENIE_CHAT_DB", DEFAULT_CHAT_DB))
@@ -0,0 +1,183 @@
+import zlib
+import numpy as np
+import pandas as pd
+
+MERSENNE_PRIME = (1 << 61) - 1
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_SIZE = 5
+N_FEATURES = 2 ** 20
+
+
+def shingle_hashes(text, k=SHINGLE_SIZE):
+    """
+    Returns the distinct 32-bit hashes of the k-word shingles of text.
+    """
+    words = text.lower().split()
+    if len(words) < k:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = (" ".join(words[i:i + k]) for i in range(len(words) - k + 1))
+    return np.unique(np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64))
+
+
+class MinHasher:
+    """
+    MinHash signatures over num_perm permutations of the form (a*x + b) mod (2^61 - 1).
+    a and b stay below 2^32 so the products of 32-bit shingle hashes never overflow uint64.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes, block=4096):
+        """
+        Returns the signature of a set of shingle hashes, processed in blocks to bound memory.
+        """
+        signature = np.full(len(self.a), MERSENNE_PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), block):
+            values = (hashes[start:start + block, None] * self.a + self.b) % MERSENNE_PRIME
+            np.minimum(signature, values.min(axis=0), out=signature)
+        return signature
+
+
+class Corpus:
+    """
+    Documents added one at a time to a sparse TF-IDF model. Term counts come from a
+    stateless HashingVectorizer and document frequencies are kept as a running vector,
+    so adding a document never refits the vocabulary; the weighted matrix is rebuilt
+    from the stored counts on the next query. Near-duplicates are found with MinHash
+    signatures bucketed by LSH bands and confirmed by their estimated Jaccard similarity.
+    """
+
+    def __init__(self, n_features=N_FEATURES, duplicate_threshold=0.8, num_perm=NUM_PERM, bands=BANDS):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, stop_words="english", alternate_sign=False, norm=None
+        )
+        self.duplicate_threshold = duplicate_threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.minhasher = MinHasher(num_perm)
+        self.doc_ids = []
+        self.names = {}
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.duplicates = []
+        self._counts = []
+        self._signatures = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._positions = {}
+        self._tfidf = None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._positions
+
+    def add(self, doc_id, name, text):
+        """
+        Adds a document and returns [(other_id, jaccard)] for the earlier documents it
+        nearly duplicates. Adding an existing doc_id does nothing.
+        """
+        if doc_id in self._positions:
+            return []
+        counts = self.vectorizer.transform([text]).tocsr()
+        self.df[counts.indices] += 1
+        self._positions[doc_id] = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.names[doc_id] = name
+        self._counts.append(counts)
+        self._tfidf = None
+
+        hashes = shingle_hashes(text)
+        if not len(hashes):
+            return []
+        signature = self.minhasher.signature(hashes)
+        found = []
+        for other_id in self._candidates(signature):
+            jaccard = float(np.mean(signature == self._signatures[other_id]))
+            if jaccard >= self.duplicate_threshold:
+                found.append((other_id, jaccard))
+                self.duplicates.append((other_id, doc_id, jaccard))
+        self._signatures[doc_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(doc_id)
+        return sorted(found, key=lambda item: -item[1])
+
+    def _band_keys(self, signature):
+        return [band.tobytes() for band in signature.reshape(self.bands, self.rows_per_band)]
+
+    def _candidates(self, signature):
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        return candidates
+
+    def tfidf(self):
+        """
+        Returns the L2-normalized TF-IDF matrix (documents x hashed terms), using smoothed
+        idf = ln((1 + n) / (1 + df)) + 1 as in scikit-learn. Cached until the next add.
+        """
+        if self._tfidf is None:
+            import scipy.sparse as sp
+            from sklearn.preprocessing import normalize
+
+            matrix = sp.vstack(self._counts, format="csr").astype(np.float64)
+            idf = np.log((1 + len(self)) / (1 + self.df)) + 1
+            matrix.data *= idf[matrix.indices]
+            self._tfidf = normalize(matrix, norm="l2", copy=False)
+        return self._tfidf
+
+    def similar(self, doc_id, k=5):
+        """
+        Returns the k documents most similar to doc_id as (other_id, cosine similarity),
+        highest first.
+        """
+        matrix = self.tfidf()
+        position = self._positions[doc_id]
+        scores = (matrix @ matrix[position].T).toarray().ravel()
+        scores[position] = -1.0
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    def similar_pairs(self, k=10):
+        """
+        Returns the k most similar pairs of distinct documents as a DataFrame with
+        document_a, document_b and similarity columns, computed from the sparse
+        similarity matrix without densifying it.
+        """
+        import scipy.sparse as sp
+
+        columns = ["document_a", "document_b", "similarity"]
+        if len(self) < 2:
+            return pd.DataFrame(columns=columns)
+        matrix = self.tfidf()
+        pairs = sp.triu(matrix @ matrix.T, k=1).tocoo()
+        k = min(k, pairs.nnz)
+        if k == 0:
+            return pd.DataFrame(columns=columns)
+        top = np.argpartition(pairs.data, -k)[-k:]
+        top = top[np.argsort(-pairs.data[top])]
+        return pd.DataFrame(
+            [(self.names[self.doc_ids[pairs.row[i]]], self.names[self.doc_ids[pairs.col[i]]], float(pairs.data[i])) for i in top],
+            columns=columns,
+        )
+
+    def duplicate_frame(self):
+        """
+        Returns the flagged near-duplicate pairs as a DataFrame.
+        """
+        return pd.DataFrame(
+            [(self.names[a], self.names[b], jaccard) for a, b, jaccard in self.duplicates],
+            columns=["document_a", "document_b", "estimated_jaccard"],
+        )
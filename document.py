@@ -0,0 +1,206 @@
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+from cache import hash_bytes, hash_file
+from text_index import InvertedIndex
+
+
+def open_pdf(source):
+    """
+    Opens a PDF with PyMuPDF from a file path or from bytes.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+class ParsedDocument:
+    """
+    A PDF parsed once per upload: metadata, per-page text and page geometry,
+    with table candidates extracted lazily on first access. source is the path of
+    the PDF (preferred, so later stages and workers reopen it without copying) or
+    its bytes.
+    """
+
+    def __init__(self, source, metadata, page_texts, page_sizes, doc_hash=None):
+        self.source = source
+        if doc_hash is None:
+            doc_hash = hash_file(source) if isinstance(source, (str, os.PathLike)) else hash_bytes(source)
+        self.doc_hash = doc_hash
+        self.metadata = metadata or {}
+        self.page_texts = page_texts
+        self.page_sizes = page_sizes
+        self._tables = None
+        self._index = None
+
+    @property
+    def page_count(self):
+        return len(self.page_texts)
+
+    def memory_size(self):
+        """
+        Returns the approximate bytes held by the extracted page texts and, once built,
+        the inverted index. Extracted tables are left out: the page caches and charges
+        them as a stage result of their own.
+        """
+        size = sum(sys.getsizeof(text) for text in self.page_texts)
+        if self._index is not None:
+            size += self._index.memory_size()
+        return size
+
+    def page_range(self, start_page=None, end_page=None):
+        """
+        Resolves an optional start/end page pair to a clamped range of page indices.
+        """
+        start_page = start_page or 0
+        end_page = end_page or self.page_count
+        if start_page > end_page:
+            raise ValueError("Start page cannot be greater than end page.")
+        return range(start_page, min(end_page, self.page_count))
+
+    def iter_pages(self, start_page=None, end_page=None):
+        """
+        Yields (page_number, text) pairs for the given page range.
+        """
+        for i in self.page_range(start_page, end_page):
+            yield i, self.page_texts[i]
+
+    def text(self, start_page=None, end_page=None):
+        """
+        Returns the concatenated text of the given page range.
+        """
+        return "".join(self.page_texts[i] for i in self.page_range(start_page, end_page))
+
+    @property
+    def index(self):
+        """
+        Inverted index over the page texts, built on first access.
+        """
+        if self._index is None:
+            self._index = InvertedIndex(self.page_texts)
+        return self._index
+
+    @property
+    def tables(self):
+        """
+        Tables as DataFrames (page and bbox in DataFrame.attrs), extracted on first access.
+        """
+        return self.table_frames()
+
+    def table_frames(self, workers=None):
+        """
+        Extracts tables once: a cheap PyMuPDF pass selects candidate pages and pdfplumber
+        runs only on those, across a process pool when workers > 1.
+        """
+        if self._tables is None:
+            from tables import extract_table_frames
+            self._tables = extract_table_frames(self.source, workers=workers or default_workers())
+        return self._tables
+
+
+_worker_source = None
+
+
+def default_workers():
+    """
+    Returns the page extraction worker count from GENIE_PDF_WORKERS (1 means serial).
+    """
+    return max(1, int(os.getenv("GENIE_PDF_WORKERS", "1")))
+
+
+def _init_worker(source):
+    global _worker_source
+    _worker_source = source
+
+
+def _iter_pages(pdf, start, stop):
+    for i in range(start, stop):
+        page = pdf.load_page(i)
+        yield page.get_text(), (page.rect.width, page.rect.height)
+
+
+def _extract_chunk(start, stop):
+    with open_pdf(_worker_source) as pdf:
+        return list(_iter_pages(pdf, start, stop))
+
+
+def _page_chunks(start_page, end_page, workers, min_chunk=8):
+    chunk_size = max(min_chunk, -(-(end_page - start_page) // (workers * 4)))
+    return [(start, min(start + chunk_size, end_page)) for start in range(start_page, end_page, chunk_size)]
+
+
+def iter_pdf_pages(source, start_page=None, end_page=None):
+    """
+    Yields (page_number, text) pairs from a PDF path or bytes as each page is decoded.
+    Page numbers are zero-based, like start_page and end_page.
+    """
+    with open_pdf(source) as pdf:
+        end_page = min(end_page or pdf.page_count, pdf.page_count)
+        for i in range(start_page or 0, end_page):
+            yield i, pdf.load_page(i).get_text()
+
+
+def parse_pdf(source, doc_hash=None, workers=None, on_page=None, start_page=None, end_page=None):
+    """
+    Parses a PDF path or bytes into a ParsedDocument. With start_page/end_page only
+    that range is decoded and the other pages are left empty (text "", size None), so
+    page numbers still match the file; such a partial document must not be cached as
+    the whole file. With more than one worker, the decoded range is split into chunks
+    extracted in a process pool whose workers each open the document themselves (by
+    path, so only the path is sent to them); the result is identical to the serial path.
+    When given, on_page(page_number, page_count, text) is called as each page arrives.
+    """
+    workers = workers or default_workers()
+
+    def collect(pages):
+        nonlocal next_page
+        for text, size in pages:
+            if on_page:
+                on_page(next_page, page_count, text)
+            page_texts[next_page] = text
+            page_sizes[next_page] = size
+            next_page += 1
+
+    with open_pdf(source) as pdf:
+        metadata = dict(pdf.metadata or {})
+        page_count = pdf.page_count
+        start = start_page or 0
+        stop = min(end_page or page_count, page_count)
+        if start > stop:
+            raise ValueError("Start page cannot be greater than end page.")
+        page_texts = [""] * page_count
+        page_sizes = [None] * page_count
+        next_page = start
+        chunks = _page_chunks(start, stop, workers)
+        parallel = workers > 1 and len(chunks) > 1
+        if not parallel:
+            collect(_iter_pages(pdf, start, stop))
+
+    if parallel:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker, initargs=(source,)) as pool:
+            for chunk in pool.map(_extract_chunk, *zip(*chunks)):
+                collect(chunk)
+
+    logging.info(f"Parsed {stop - start} of {page_count} PDF pages using {workers} worker(s).")
+    return ParsedDocument(source, metadata, page_texts, page_sizes, doc_hash=doc_hash)
+
+
+def as_document(source, workers=None, start_page=None, end_page=None):
+    """
+    Returns a ParsedDocument for a ParsedDocument, a file path, raw PDF bytes or a
+    file-like object. File-like objects are spooled to disk rather than read into memory.
+    For raw input, start_page/end_page limit decoding to that range (see parse_pdf);
+    an existing ParsedDocument is returned as is.
+    """
+    if isinstance(source, ParsedDocument):
+        return source
+    pages = {"workers": workers, "start_page": start_page, "end_page": end_page}
+    if isinstance(source, (str, os.PathLike, bytes)):
+        return parse_pdf(source, **pages)
+    if isinstance(source, (bytearray, memoryview)):
+        return parse_pdf(bytes(source), **pages)
+    from spool import get_upload_spool
+    path, doc_hash = get_upload_spool().spool(source)
+    return parse_pdf(path, doc_hash=doc_hash, **pages)
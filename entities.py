@@ -0,0 +1,73 @@
+import re
+import pandas as pd
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+NER_UNUSED_PIPES = ("tagger", "parser", "attribute_ruler", "lemmatizer", "senter")
+ENTITY_COLUMNS = ["Entities", "Type", "Count", "Page", "Offset"]
+
+
+def _sentence_spans(text):
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        yield start, match.start()
+        start = match.end()
+    yield start, len(text)
+
+
+def _split_span(text, start, end, max_chars):
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + 1, start + max_chars)
+        cut = cut if cut > start else start + max_chars
+        yield start, cut
+        start = cut
+    if end > start:
+        yield start, end
+
+
+def iter_text_chunks(pages, max_chars=100000):
+    """
+    Splits (page_number, text) pairs on sentence boundaries into chunks of at most
+    max_chars characters. Yields (chunk, (page_number, offset)) tuples where offset
+    is the chunk's character position within its page.
+    """
+    for page_number, text in pages:
+        chunk_start = chunk_end = 0
+        for sentence_start, sentence_end in _sentence_spans(text):
+            for part_start, part_end in _split_span(text, sentence_start, sentence_end, max_chars):
+                if part_end - chunk_start > max_chars and chunk_end > chunk_start:
+                    yield text[chunk_start:chunk_end], (page_number, chunk_start)
+                    chunk_start = part_start
+                chunk_end = part_end
+        if chunk_end > chunk_start:
+            yield text[chunk_start:chunk_end], (page_number, chunk_start)
+
+
+def extract_entity_table(nlp, pages, batch_size=32, n_process=1, max_chars=100000):
+    """
+    Runs NER over page chunks with nlp.pipe, disabling components NER does not need,
+    and streams the results into a deduplicated table with one row per (entity, label):
+    its count plus the 1-based page and in-page offset of its first occurrence.
+    """
+    disabled = [name for name in NER_UNUSED_PIPES if name in nlp.pipe_names]
+    chunks = iter_text_chunks(pages, max_chars=min(max_chars, nlp.max_length))
+    found = {}
+    for doc, (page_number, offset) in nlp.pipe(chunks, as_tuples=True, batch_size=batch_size, n_process=n_process, disable=disabled):
+        for ent in doc.ents:
+            key = (ent.text, ent.label_)
+            if key in found:
+                found[key][0] += 1
+            else:
+                found[key] = [1, page_number + 1, offset + ent.start_char]
+
+    table = pd.DataFrame(
+        [(text, label, count, page, offset) for (text, label), (count, page, offset) in found.items()],
+        columns=ENTITY_COLUMNS
+    )
+    return table.astype({"Entities": "string", "Type": "category", "Count": "int32", "Page": "int32", "Offset": "int32"})
+
+
+def entity_label_counts(table):
+    """
+    Returns the total number of entity mentions per label.
+    """
+    return table.groupby("Type", observed=True)["Count"].sum().sort_values(ascending=False).rename("Mentions").reset_index()
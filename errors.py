@@ -0,0 +1,16 @@
+class ErrorResult(str):
+    """
+    Error or warning message that the utils functions return in place of a result.
+    It is still a str, so callers that display it keep working, but it is recognised
+    by its type rather than by its wording: text that happens to start with "Error"
+    is an ordinary result.
+    """
+
+    __slots__ = ()
+
+
+def is_error_result(value):
+    """
+    Returns True for the error and warning results returned by the utils functions.
+    """
+    return isinstance(value, ErrorResult)
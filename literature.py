@@ -0,0 +1,131 @@
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache import ResultCache, make_key
+
+DEFAULT_BASE_URL = "https://api.literature-search.com"
+
+
+def page_results(data):
+    """
+    Returns the list of result records from one page of search results, accepting
+    either a bare list or an object with a "results" (or "items") list.
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for field in ("results", "items", "data"):
+            if isinstance(data.get(field), list):
+                return data[field]
+    return []
+
+
+def has_more_pages(data, page_size):
+    """
+    Returns True when a page of results indicates that another page follows.
+    """
+    if isinstance(data, dict):
+        if "next_page" in data or "next" in data:
+            return bool(data.get("next_page") or data.get("next"))
+        if "total" in data and "page" in data:
+            return data["page"] * page_size < data["total"]
+    return len(page_results(data)) >= page_size
+
+
+class LiteratureClient:
+    """
+    Client for the literature search API. Requests go through one pooled keep-alive
+    session with connect/read timeouts and retries on transient server errors. Pages are
+    cached for ttl seconds, and several queries or pages are fetched concurrently on a
+    thread pool.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=(3.05, 20), ttl=600, max_entries=256,
+                 pool_size=10, max_workers=8, page_size=20):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.base_url = base_url
+        self.timeout = timeout
+        self.page_size = page_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504), allowed_methods=("GET",)),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = ResultCache(max_items=max_entries, ttl=ttl)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="literature")
+
+    def search(self, query, page=1, page_size=None):
+        """
+        Returns the decoded JSON of one page of results for query. The query is sent as
+        an encoded parameter. Raises requests.RequestException on failure; failures are
+        not cached.
+        """
+        page_size = page_size or self.page_size
+        params = {"query": query, "page": page, "page_size": page_size}
+        key = make_key(self.base_url, "literature", **params)
+        found, data = self.cache.get(key, stage="literature")
+        if found:
+            return data
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        self.cache.set(key, data)
+        return data
+
+    def search_many(self, pairs, page_size=None):
+        """
+        Fetches several (query, page) pairs concurrently and yields (query, page, data, error)
+        tuples as they complete; error is None on success.
+        """
+        futures = {
+            self._executor.submit(self.search, query, page, page_size): (query, page)
+            for query, page in pairs
+        }
+        for future in as_completed(futures):
+            query, page = futures[future]
+            try:
+                yield query, page, future.result(), None
+            except Exception as e:
+                logging.error(f"Error searching literature for {query!r} (page {page}): {e}")
+                yield query, page, None, e
+
+    def iter_pages(self, query, max_pages=5, page_size=None, prefetch=2):
+        """
+        Yields (page, results) in page order, up to max_pages, fetching up to prefetch
+        pages ahead in the background and stopping after the last page.
+        """
+        page_size = page_size or self.page_size
+        pending = {}
+        next_page = 1
+        try:
+            for page in range(1, max_pages + 1):
+                while next_page <= min(max_pages, page + prefetch):
+                    pending[next_page] = self._executor.submit(self.search, query, next_page, page_size)
+                    next_page += 1
+                data = pending.pop(page).result()
+                yield page, page_results(data)
+                if not has_more_pages(data, page_size):
+                    break
+        finally:
+            for future in pending.values():
+                future.cancel()
+
+
+@functools.lru_cache(maxsize=None)
+def get_literature_client():
+    """
+    Returns the process-wide literature client for GENIE_LITERATURE_URL, with the read
+    timeout from GENIE_LITERATURE_TIMEOUT and cache lifetime from GENIE_LITERATURE_CACHE_TTL.
+    """
+    return LiteratureClient(
+        base_url=os.getenv("GENIE_LITERATURE_URL", DEFAULT_BASE_URL),
+        timeout=(3.05, float(os.getenv("GENIE_LITERATURE_TIMEOUT", "20"))),
+        ttl=float(os.getenv("GENIE_LITERATURE_CACHE_TTL", "600")),
+    )
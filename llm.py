@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from cache import ResultCache
+from metrics import span
+
+
+def normalize_prompt(prompt):
+    """
+    Collapses whitespace so prompts that differ only in spacing share a cache entry.
+    """
+    return " ".join(prompt.split())
+
+
+def prompt_key(prompt, params, model=""):
+    """
+    Builds the cache/coalescing key from the model, the normalized prompt and the model
+    parameters, so responses from different backends or models never share an entry.
+    """
+    payload = json.dumps({"model": model, "prompt": normalize_prompt(prompt), "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class GeminiBackend:
+    """
+    Calls Gemini through the google.generativeai SDK, configuring it once per process.
+    Single responses and streams both go through GenerativeModel(model), so they come
+    from the same model (GENIE_GEMINI_MODEL by default).
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key, model=None):
+        self.api_key = api_key
+        self.model = model or os.getenv("GENIE_GEMINI_MODEL", "gemini-pro")
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def _model(self):
+        import google.generativeai as genai
+        with self._lock:
+            if not self._configured:
+                genai.configure(api_key=self.api_key)
+                self._configured = True
+        return genai.GenerativeModel(self.model)
+
+    def generate(self, prompt, **params):
+        return self._model().generate_content(prompt, **params).text
+
+    def stream(self, prompt, **params):
+        for chunk in self._model().generate_content(prompt, stream=True, **params):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """
+    Local stand-in model for tests and offline development. Returns responder(prompt, params),
+    or an echo of the prompt, and records every upstream call it receives.
+    """
+
+    name = "fake"
+    model = "fake"
+
+    def __init__(self, responder=None, delay=0.0):
+        self.responder = responder or (lambda prompt, params: f"[fake response] {prompt}")
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, **params):
+        with self._lock:
+            self.calls.append((prompt, params))
+        if self.delay:
+            time.sleep(self.delay)
+        return self.responder(prompt, params)
+
+    def stream(self, prompt, **params):
+        words = self.generate(prompt, **params).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + " "
+
+
+class HttpBackend:
+    """
+    Posts {"prompt", "params"} as JSON to base_url and reads the "text" field of the reply.
+    Lets the whole generation path run against a local stub server.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url, timeout=60):
+        import requests
+        self.base_url = base_url
+        self.model = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def generate(self, prompt, **params):
+        response = self.session.post(self.base_url, json={"prompt": prompt, "params": params}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["text"]
+
+
+class LLMClient:
+    """
+    Shared LLM client: answers repeated prompts from a TTL/LRU cache (optionally persisted
+    to disk) and coalesces identical concurrent requests into a single upstream call.
+    """
+
+    def __init__(self, backend, ttl=3600, max_entries=256, cache_dir=None):
+        self.backend = backend
+        self.model_id = f"{backend.name}:{getattr(backend, 'model', '')}"
+        self.cache = ResultCache(max_items=max_entries, disk_dir=cache_dir, ttl=ttl)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def generate(self, prompt, **params):
+        """
+        Returns the model's response, from cache when possible. Exceptions raised by the
+        backend propagate to every caller waiting on the same request and are not cached.
+        """
+        with span("llm.generate", chars=len(prompt)):
+            return self._generate(prompt, **params)
+
+    def _generate(self, prompt, **params):
+        key = prompt_key(prompt, params, self.model_id)
+        with self._lock:
+            # Looking up the cache and registering the request under one lock means an
+            # owner that has just finished is seen through its cached response.
+            found, response = self.cache.get(key, stage="llm")
+            if found:
+                return response
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            response = self.backend.generate(prompt, **params)
+            if response is not None:
+                self.cache.set(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stream(self, prompt, cancel_event=None, metrics=None, **params):
+        """
+        Yields partial response text as it arrives. Falls back to a single chunk from
+        generate() when the backend cannot stream, and serves cached responses directly.
+        Stops early when cancel_event is set or the consumer closes the generator; only
+        complete responses are cached. When given, the metrics dict receives
+        time_to_first_token, total_latency, chunks, streamed, cached and cancelled.
+        """
+        metrics = metrics if metrics is not None else {}
+        metrics.update({"time_to_first_token": None, "total_latency": None, "chunks": 0, "streamed": False, "cached": False, "cancelled": False})
+        started = time.perf_counter()
+        key = prompt_key(prompt, params, self.model_id)
+        found, response = self.cache.get(key, stage="llm")
+        if found or not hasattr(self.backend, "stream"):
+            metrics["cached"] = found
+            response = response if found else self.generate(prompt, **params)
+            metrics["time_to_first_token"] = metrics["total_latency"] = time.perf_counter() - started
+            metrics["chunks"] = 1
+            yield response
+            return
+
+        metrics["streamed"] = True
+        with self._lock:
+            self.upstream_calls += 1
+        chunks = []
+        stream = self.backend.stream(prompt, **params)
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    metrics["cancelled"] = True
+                    break
+                if not chunks:
+                    metrics["time_to_first_token"] = time.perf_counter() - started
+                chunks.append(chunk)
+                metrics["chunks"] = len(chunks)
+                yield chunk
+            else:
+                self.cache.set(key, "".join(chunks))
+        except GeneratorExit:
+            metrics["cancelled"] = True
+            raise
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+            metrics["total_latency"] = time.perf_counter() - started
+
+    def stats(self):
+        """
+        Returns cache statistics plus upstream and coalesced request counts.
+        """
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update({"upstream_calls": self.upstream_calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)})
+        return stats
+
+
+def create_backend(api_key=None):
+    """
+    Builds the backend named by GENIE_LLM_BACKEND: "gemini" (default), "fake", or "http"
+    (a local stub server at GENIE_LLM_BASE_URL).
+    """
+    name = os.getenv("GENIE_LLM_BACKEND", "gemini")
+    if name == "fake":
+        return FakeBackend()
+    if name == "http":
+        return HttpBackend(os.getenv("GENIE_LLM_BASE_URL", "http://127.0.0.1:8765/generate"))
+    if name == "gemini":
+        return GeminiBackend(api_key)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(api_key=None):
+    """
+    Returns the process-wide client for an API key, shared by every Streamlit session.
+    Caching is configured by GENIE_LLM_CACHE_TTL (seconds), GENIE_LLM_CACHE_SIZE and GENIE_LLM_CACHE_DIR.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = LLMClient(
+                create_backend(api_key),
+                ttl=float(os.getenv("GENIE_LLM_CACHE_TTL", "3600")),
+                max_entries=int(os.getenv("GENIE_LLM_CACHE_SIZE", "256")),
+                cache_dir=os.getenv("GENIE_LLM_CACHE_DIR") or None,
+            )
+            _clients[api_key] = client
+            logging.info(f"Created {client.backend.name} LLM client.")
+        return client
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: refills at rate tokens per second up to capacity. Callers
+    reserve a token under a thread lock and then wait for it on their own event loop,
+    so one bucket can be shared by batches running on different threads and loops.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token, possibly borrowed from the future, and returns how many seconds
+        to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_buckets = weakref.WeakKeyDictionary()
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(client, rate, burst=None):
+    """
+    Returns the process-wide rate limiter for a client, creating it on first use, so
+    every generator wrapping the same client draws from one quota.
+    """
+    with _buckets_lock:
+        if client not in _buckets:
+            _buckets[client] = TokenBucket(rate, burst)
+        return _buckets[client]
+
+
+def is_quota_error(error):
+    """
+    Returns True for rate-limit/quota errors: Gemini's ResourceExhausted/TooManyRequests,
+    HTTP 429 responses and messages mentioning a quota.
+    """
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "QuotaError"):
+        return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "rate limit" in message
+
+
+class AsyncGenerator:
+    """
+    Runs LLMClient requests concurrently under a concurrency semaphore and a token-bucket
+    rate limit, retrying quota errors with exponential backoff and jitter. The bucket is
+    shared by every generator for the same client, so rate is requests per second from
+    this process.
+    """
+
+    def __init__(self, client, concurrency=4, rate=2.0, burst=None, max_retries=5, base_delay=1.0, max_delay=30.0):
+        self.client = client
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.bucket = shared_bucket(client, rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def _generate(self, semaphore, bucket, prompt, params):
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                await bucket.acquire()
+                try:
+                    return await asyncio.to_thread(self.client.generate, prompt, **params)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_quota_error(e):
+                        raise
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+                    logging.warning(f"Quota error from LLM backend, retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+    async def generate(self, prompt, **params):
+        """
+        Generates a single response under the rate limit and retry policy.
+        """
+        results = [result async for result in self.as_completed([prompt], **params)]
+        _, _, response, error = results[0]
+        if error:
+            raise error
+        return response
+
+    async def as_completed(self, prompts, **params):
+        """
+        Submits every prompt at once and yields (index, prompt, response, error) tuples
+        in completion order; error is None on success.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = self.bucket
+
+        async def run(index, prompt):
+            try:
+                return index, prompt, await self._generate(semaphore, bucket, prompt, params), None
+            except Exception as e:
+                return index, prompt, None, e
+
+        tasks = [asyncio.create_task(run(index, prompt)) for index, prompt in enumerate(prompts)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def run_batch(self, prompts, on_result=None, **params):
+        """
+        Synchronous entry point: runs the batch on a fresh event loop, calling
+        on_result(index, prompt, response, error) as each one completes, and returns
+        the responses (or exceptions) in prompt order.
+        """
+        results = [None] * len(prompts)
+
+        async def consume():
+            async for index, prompt, response, error in self.as_completed(prompts, **params):
+                results[index] = error or response
+                if on_result:
+                    on_result(index, prompt, response, error)
+
+        asyncio.run(consume())
+        return results
+
+
+def get_async_generator(client):
+    """
+    Wraps a client with the limits from GENIE_LLM_CONCURRENCY and GENIE_LLM_RATE (requests per second).
+    """
+    return AsyncGenerator(
+        client,
+        concurrency=int(os.getenv("GENIE_LLM_CONCURRENCY", "4")),
+        rate=float(os.getenv("GENIE_LLM_RATE", "2")),
+    )
@@ -0,0 +1,115 @@
+import argparse
+import functools
+import importlib
+import logging
+import os
+import threading
+import time
+
+DATA_DIR = os.getenv("GENIE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+NLTK_DATA_DIR = os.path.join(DATA_DIR, "nltk")
+SPACY_MODEL = "en_core_web_sm"
+VADER_RESOURCE = "sentiment/vader_lexicon.zip"
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def _record_timing(name, seconds):
+    with _timings_lock:
+        _timings[name] = seconds
+    logging.info(f"Loaded {name} in {seconds * 1000:.1f} ms")
+
+
+def timed_loader(name):
+    """
+    Decorates a loader so its first (uncached) call is timed and reported in load_timings().
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            _record_timing(name, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
+
+
+def load_timings():
+    """
+    Returns {resource name: seconds} for every module and model loaded so far.
+    """
+    with _timings_lock:
+        return dict(_timings)
+
+
+@functools.lru_cache(maxsize=None)
+def load_module(name):
+    """
+    Imports a module on first use, recording how long the import took.
+    """
+    return timed_loader(f"module {name}")(importlib.import_module)(name)
+
+
+def load_page(module_name, function_name):
+    """
+    Returns a page render function, importing its module on first use.
+    """
+    return getattr(load_module(module_name), function_name)
+
+
+@functools.lru_cache(maxsize=None)
+@timed_loader(f"spaCy {SPACY_MODEL}")
+def get_nlp():
+    """
+    Loads the spaCy pipeline once per process, preferring a copy under GENIE_DATA_DIR
+    and falling back to the installed model package. Never touches the network.
+    """
+    import spacy
+    local_model = os.path.join(DATA_DIR, "spacy", SPACY_MODEL)
+    return spacy.load(local_model if os.path.isdir(local_model) else SPACY_MODEL)
+
+
+def _ensure_nltk_resource(resource, package):
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        raise LookupError(
+            f"NLTK resource '{package}' was not found in {NLTK_DATA_DIR}. "
+            f"Run 'python loaders.py --download' once to install it."
+        )
+
+
+@functools.lru_cache(maxsize=None)
+@timed_loader("NLTK VADER analyzer")
+def get_sentiment_analyzer():
+    """
+    Returns the process-wide VADER analyzer, resolving its lexicon from GENIE_DATA_DIR.
+    """
+    _ensure_nltk_resource(VADER_RESOURCE, "vader_lexicon")
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+def download_resources():
+    """
+    Downloads the NLTK data used by the app into GENIE_DATA_DIR. This is the only
+    code path that goes to the network.
+    """
+    import nltk
+    os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+    nltk.download("vader_lexicon", download_dir=NLTK_DATA_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage GenieSynth's local model data.")
+    parser.add_argument("--download", action="store_true", help="download NLTK data into GENIE_DATA_DIR")
+    args = parser.parse_args()
+    if args.download:
+        download_resources()
+    else:
+        parser.print_help()
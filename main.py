@@ -1,8 +1,9 @@
+import os
+import time
+_startup = time.perf_counter()
 import streamlit as st
-from page.main_page import main_page
-from page.experiment_templates import experiment_templates_page
-from page.pdf_processing import pdf_processing_page
-from page.real_time_collaboration import real_time_collaboration_page
+from loaders import load_page, load_timings
+from metrics import recording, span, start_metrics_server
 
 st.set_page_config(
     page_title="GenieSynth",
@@ -15,11 +16,12 @@ st.set_page_config(
 if 'page' not in st.session_state:
     st.session_state.page = "Main Page"
 
+# Page modules are imported on first visit; only the selected page is ever loaded.
 pages = {
-    "Main Page": main_page,
-    "Experiment Templates": experiment_templates_page,
-    "PDF Processing": pdf_processing_page,
-    "Real-time Collaboration": real_time_collaboration_page
+    "Main Page": ("page.main_page", "main_page"),
+    "Experiment Templates": ("page.experiment_templates", "experiment_templates_page"),
+    "PDF Processing": ("page.pdf_processing", "pdf_processing_page"),
+    "Real-time Collaboration": ("page.real_time_collaboration", "real_time_collaboration_page")
 }
 
 query_params = st.query_params
@@ -75,11 +77,21 @@ icons = {
 for page_name in pages.keys():
     sidebar_button(page_name, icons[page_name], st.session_state.page)
 
-if st.session_state.page == "Main Page":
-    main_page()
-elif st.session_state.page == "Experiment Templates":
-    experiment_templates_page()
-elif st.session_state.page == "PDF Processing":
-    pdf_processing_page()
-elif st.session_state.page == "Real-time Collaboration":
-    real_time_collaboration_page()
+if os.getenv("GENIE_METRICS_PORT"):
+    start_metrics_server(int(os.getenv("GENIE_METRICS_PORT")))
+
+with recording() as rerun_spans, span("page", page=st.session_state.page):
+    load_page(*pages[st.session_state.page])()
+
+if os.getenv("GENIE_DEBUG_METRICS"):
+    with st.sidebar.expander("Rerun Breakdown"):
+        st.dataframe(
+            [{**record, "span": "  " * record["depth"] + record["span"]} for record in sorted(rerun_spans, key=lambda record: record["start"])],
+            use_container_width=True
+        )
+
+if os.getenv("GENIE_STARTUP_REPORT"):
+    with st.sidebar.expander("Startup Timings"):
+        st.write(f"**This rerun:** {(time.perf_counter() - _startup) * 1000:.1f} ms")
+        for name, seconds in load_timings().items():
+            st.write(f"{name}: {seconds * 1000:.1f} ms")
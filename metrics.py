@@ -0,0 +1,305 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from errors import is_error_result
+
+logger = logging.getLogger("genie.metrics")
+
+_current_span = contextvars.ContextVar("genie_current_span", default=None)
+_current_recorder = contextvars.ContextVar("genie_current_recorder", default=None)
+_totals = {}
+_cache_totals = {}
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+_server = None
+_active_roots = 0
+_memory_trace = None
+
+
+def _trace_memory():
+    return bool(os.getenv("GENIE_METRICS_MEMORY"))
+
+
+def describe_input(value):
+    """
+    Returns size attributes for a function input: pages and characters for a parsed
+    document, characters for text, bytes for raw PDF data, rows for a DataFrame and
+    terms for a TermStats table.
+    """
+    if isinstance(value, str):
+        return {"chars": len(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"bytes": len(value)}
+    if hasattr(value, "page_texts"):
+        return {"pages": len(value.page_texts), "chars": sum(len(text) for text in value.page_texts)}
+    if hasattr(value, "columns"):
+        return {"rows": len(value)}
+    if hasattr(value, "terms"):
+        return {"terms": len(value.terms)}
+    return {}
+
+
+class MemoryTrace:
+    """
+    A tracemalloc session owned by one root span. tracemalloc counts the allocations of
+    every thread, so the session is marked invalid as soon as another root span (e.g. a
+    second Streamlit session's rerun) starts while it runs.
+    """
+
+    def __init__(self):
+        self.valid = True
+
+
+class Span:
+    """
+    One timed section: wall and CPU time of the current thread, peak traced memory
+    (when GENIE_METRICS_MEMORY is set) and attributes such as input sizes and the
+    cache hits and misses that happened inside it. Peak memory is only recorded while
+    a single root span runs in the process; spans that overlap another root span leave
+    it out rather than report allocations made by other threads.
+    """
+
+    def __init__(self, name, attrs, parent, trace=None):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.trace = parent.trace if parent else trace
+        self.depth = parent.depth + 1 if parent else 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.status = "ok"
+        self.wall = self.cpu = 0.0
+        self.peak_bytes = None
+        self._child_peak = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def _start(self):
+        if self.trace is not None:
+            self._start_size, outer_peak = tracemalloc.get_traced_memory()
+            if self.parent:
+                self.parent._child_peak = max(self.parent._child_peak, outer_peak)
+            tracemalloc.reset_peak()
+        self.started = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def _finish(self):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.thread_time() - self._cpu
+        if self.trace is not None and self.trace.valid and hasattr(self, "_start_size"):
+            peak = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            self.peak_bytes = max(0, peak - self._start_size)
+            if self.parent:
+                self.parent._child_peak = max(self.parent._child_peak, peak)
+
+    def to_dict(self):
+        record = {
+            "span": self.name,
+            "start": round(self.started, 3),
+            "depth": self.depth,
+            "status": self.status,
+            "wall_ms": round(self.wall * 1000, 3),
+            "cpu_ms": round(self.cpu * 1000, 3),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+        if self.peak_bytes is not None:
+            record["peak_bytes"] = self.peak_bytes
+        record.update(self.attrs)
+        return record
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Times the enclosed block as a span nested under the current one. The span is logged
+    as one JSON line, added to the process-wide totals and to the active recorder.
+    """
+    global _active_roots, _memory_trace
+    parent = _current_span.get()
+    started_tracing = False
+    if parent is None:
+        with _lock:
+            _active_roots += 1
+            if _memory_trace is not None:
+                _memory_trace.valid = False
+            elif _active_roots == 1 and _trace_memory() and not tracemalloc.is_tracing():
+                _memory_trace = MemoryTrace()
+                started_tracing = True
+    current = Span(name, attrs, parent, trace=_memory_trace if started_tracing else None)
+    token = _current_span.set(current)
+    if started_tracing:
+        tracemalloc.start()
+    current._start()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current._finish()
+        if started_tracing:
+            tracemalloc.stop()
+        if parent is None:
+            with _lock:
+                _active_roots -= 1
+                if started_tracing:
+                    _memory_trace = None
+        _current_span.reset(token)
+        _finish_span(current)
+
+
+def _finish_span(current):
+    record = current.to_dict()
+    logger.info(json.dumps(record, default=str))
+    with _lock:
+        totals = _totals.setdefault(current.name, {"count": 0, "errors": 0, "wall": 0.0, "cpu": 0.0, "peak_bytes": 0})
+        totals["count"] += 1
+        totals["errors"] += current.status != "ok"
+        totals["wall"] += current.wall
+        totals["cpu"] += current.cpu
+        totals["peak_bytes"] = max(totals["peak_bytes"], current.peak_bytes or 0)
+    recorder = _current_recorder.get()
+    if recorder is not None:
+        recorder.append(record)
+    if current.parent is None and os.getenv("GENIE_METRICS_FILE"):
+        write_prometheus_file(os.getenv("GENIE_METRICS_FILE"))
+
+
+def instrumented(name=None):
+    """
+    Decorator that runs a function inside a span, records the size of its first argument
+    and marks the span as an error when the function returns a utils error result.
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **(describe_input(args[0]) if args else {})) as current:
+                result = func(*args, **kwargs)
+                if is_error_result(result):
+                    current.status = "error"
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_cache(stage, outcome):
+    """
+    Counts a cache lookup against the current span and its ancestors and in the totals.
+    outcome is "hits", "disk_hits" or "misses".
+    """
+    hit = outcome != "misses"
+    current = _current_span.get()
+    while current is not None:
+        if hit:
+            current.cache_hits += 1
+        else:
+            current.cache_misses += 1
+        current = current.parent
+    with _lock:
+        counts = _cache_totals.setdefault(stage, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+
+@contextlib.contextmanager
+def recording():
+    """
+    Collects the records of every span finished in the enclosed block, e.g. one Streamlit
+    rerun, into the yielded list.
+    """
+    records = []
+    token = _current_recorder.set(records)
+    try:
+        yield records
+    finally:
+        _current_recorder.reset(token)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """
+    Renders the process-wide span and cache totals in the Prometheus text format.
+    """
+    with _lock:
+        totals = {name: dict(values) for name, values in _totals.items()}
+        cache_totals = {stage: dict(values) for stage, values in _cache_totals.items()}
+
+    lines = []
+    metrics = [
+        ("genie_span_calls_total", "counter", "Number of finished spans.", "count"),
+        ("genie_span_errors_total", "counter", "Number of spans that failed.", "errors"),
+        ("genie_span_wall_seconds_total", "counter", "Wall-clock seconds spent in spans.", "wall"),
+        ("genie_span_cpu_seconds_total", "counter", "CPU seconds spent in spans by their thread.", "cpu"),
+        ("genie_span_peak_bytes", "gauge", "Largest traced memory peak of a span.", "peak_bytes"),
+    ]
+    for metric, kind, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, values in sorted(totals.items()):
+            lines.append(f'{metric}{{span="{_label(name)}"}} {values[field]}')
+    lines.append("# HELP genie_cache_lookups_total Result cache lookups by stage and outcome.")
+    lines.append("# TYPE genie_cache_lookups_total counter")
+    for stage, counts in sorted(cache_totals.items()):
+        for outcome, count in counts.items():
+            lines.append(f'genie_cache_lookups_total{{stage="{_label(stage)}",outcome="{outcome}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_file(path):
+    """
+    Atomically writes the Prometheus text to path, e.g. for node_exporter's textfile collector.
+    Writes from different threads are serialized and use per-thread temporary files.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with _file_lock:
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(prometheus_text())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Error writing metrics file {path}: {e}")
+
+
+def start_metrics_server(port):
+    """
+    Serves the Prometheus text at http://<host>:port/metrics from a daemon thread.
+    Only the first call in a process starts a server.
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("", port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
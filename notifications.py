@@ -0,0 +1,284 @@
+import functools
+import hashlib
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+def build_message(sender, to_email, subject, message):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(message, 'plain'))
+    return msg
+
+
+class SMTPPool:
+    """
+    Keeps up to size authenticated SMTP connections open and hands them out for reuse,
+    so STARTTLS and login happen once per connection instead of once per message.
+    Connections idle for longer than max_idle seconds are checked with NOOP first.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True, size=2, timeout=30, max_idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    server, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - last_used < self.max_idle:
+                    return server
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._close(server)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, server, healthy):
+        if healthy:
+            self._idle.put((server, time.monotonic()))
+        else:
+            self._close(server)
+        self._slots.release()
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def send(self, msg):
+        """
+        Sends an email.message.Message on a pooled connection. A connection that fails
+        is closed rather than returned to the pool; the error propagates.
+        """
+        server = self._acquire()
+        try:
+            server.send_message(msg)
+        except BaseException:
+            self._release(server, healthy=False)
+            raise
+        self._release(server, healthy=True)
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+class NotificationQueue:
+    """
+    Sends notification emails from a background thread. Messages to the same recipient
+    that arrive within digest_seconds of each other go out as one digest, and failed
+    sends are retried with exponential backoff and jitter up to max_retries times.
+    enqueue never blocks on the network.
+    """
+
+    def __init__(self, pool, sender, digest_seconds=30, max_retries=5, base_delay=2.0, max_delay=300.0):
+        self.pool = pool
+        self.sender = sender
+        self.digest_seconds = digest_seconds
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._outstanding = 0
+        self._done = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, to_email, subject, message):
+        """
+        Queues a notification for to_email.
+        """
+        with self._done:
+            self._outstanding += 1
+        self._queue.put((to_email, subject, message))
+
+    def flush(self, timeout=None):
+        """
+        Sends everything queued without waiting for the digest window and blocks until
+        the queue is drained or timeout expires. Returns True when drained.
+        """
+        self._queue.put(None)
+        with self._done:
+            return self._done.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def close(self, timeout=10):
+        """
+        Flushes outstanding notifications, stops the worker and closes the pool.
+        """
+        self.flush(timeout)
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self.pool.close()
+
+    def _add(self, to_email, subject, message):
+        batch = self._pending.get(to_email)
+        if batch is None:
+            batch = self._pending[to_email] = {"items": [], "due": time.monotonic() + self.digest_seconds, "attempt": 0}
+        batch["items"].append((subject, message))
+
+    def _digest(self, items):
+        if len(items) == 1:
+            return items[0]
+        body = "\n\n---\n\n".join(f"{subject}\n\n{message}" for subject, message in items)
+        return f"{len(items)} new notifications", body
+
+    def _finish(self, count):
+        with self._done:
+            self._outstanding -= count
+            self._done.notify_all()
+
+    def _send_due(self, now, flush=False):
+        for to_email, batch in list(self._pending.items()):
+            if batch["due"] > now and not (flush and batch["attempt"] == 0):
+                continue
+            subject, body = self._digest(batch["items"])
+            try:
+                self.pool.send(build_message(self.sender, to_email, subject, body))
+            except Exception as e:
+                batch["attempt"] += 1
+                if batch["attempt"] > self.max_retries:
+                    logging.error(f"Giving up on {len(batch['items'])} notification(s) to {to_email}: {e}")
+                    self.failed += len(batch["items"])
+                    del self._pending[to_email]
+                    self._finish(len(batch["items"]))
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** (batch["attempt"] - 1)) * (0.5 + random.random() / 2)
+                    logging.warning(f"Error sending notification to {to_email}, retrying in {delay:.1f}s: {e}")
+                    batch["due"] = now + delay
+                continue
+            self.sent += len(batch["items"])
+            del self._pending[to_email]
+            self._finish(len(batch["items"]))
+
+    def _run(self):
+        while not self._stopping:
+            flushing = False
+            now = time.monotonic()
+            timeout = min((batch["due"] for batch in self._pending.values()), default=now + 1.0) - now
+            try:
+                item = self._queue.get(timeout=max(0.0, min(timeout, 1.0)))
+                if item is None:
+                    flushing = True
+                else:
+                    self._add(*item)
+                while True:
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        flushing = True
+                    else:
+                        self._add(*item)
+            except queue.Empty:
+                pass
+            try:
+                self._send_due(time.monotonic(), flush=flushing)
+            except Exception as e:
+                logging.error(f"Error in notification worker: {e}")
+
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def smtp_settings():
+    """
+    Returns the SMTP host, port and STARTTLS flag from GENIE_SMTP_HOST, GENIE_SMTP_PORT
+    and GENIE_SMTP_STARTTLS (defaults: smtp.gmail.com, 587, on).
+    """
+    return (
+        os.getenv("GENIE_SMTP_HOST", "smtp.gmail.com"),
+        int(os.getenv("GENIE_SMTP_PORT", "587")),
+        os.getenv("GENIE_SMTP_STARTTLS", "1") not in ("0", "false", "False"),
+    )
+
+
+def get_smtp_pool(username=None, password=None):
+    """
+    Returns the process-wide connection pool for the configured server and credentials.
+    Pools are keyed by a hash of the credentials, and at most GENIE_SMTP_MAX_POOLS are
+    kept; the least recently used one has its idle connections closed when evicted.
+    """
+    host, port, starttls = smtp_settings()
+    secret = hashlib.sha256(f"{username}\0{password}".encode("utf-8")).hexdigest()
+    key = (host, port, starttls, secret)
+    evicted = []
+    with _pools_lock:
+        if key in _pools:
+            _pools.move_to_end(key)
+        else:
+            _pools[key] = SMTPPool(
+                host, port, username, password, starttls=starttls,
+                size=int(os.getenv("GENIE_SMTP_POOL_SIZE", "2")),
+            )
+            while len(_pools) > max(1, int(os.getenv("GENIE_SMTP_MAX_POOLS", "4"))):
+                evicted.append(_pools.popitem(last=False)[1])
+        pool = _pools[key]
+    for old in evicted:
+        old.close()
+    return pool
+
+
+@functools.lru_cache(maxsize=None)
+def get_notifier():
+    """
+    Returns the process-wide notification queue, sending as GENIE_SMTP_USER (with
+    GENIE_SMTP_PASSWORD, or GENIE_SMTP_FROM without login) and batching digests over
+    GENIE_NOTIFY_DIGEST_SECONDS. Returns None when no sender is configured.
+    """
+    username = os.getenv("GENIE_SMTP_USER")
+    sender = os.getenv("GENIE_SMTP_FROM", username)
+    if not sender:
+        return None
+    return NotificationQueue(
+        get_smtp_pool(username, os.getenv("GENIE_SMTP_PASSWORD")),
+        sender,
+        digest_seconds=float(os.getenv("GENIE_NOTIFY_DIGEST_SECONDS", "30")),
+    )
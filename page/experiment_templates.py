@@ -1,22 +1,78 @@
 import streamlit as st
-import google.generativeai as genai
 from dotenv import load_dotenv
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-import io
 import os
+from llm import get_llm_client
+from llm_async import get_async_generator
+from metrics import instrumented
+from template_store import get_template_store
 
 load_dotenv()
 API_KEY = os.getenv("GENIE_API_KEY")
-
-def generate_gemini_response(prompt):
+VERSIONS_PER_PAGE = 5
+
+@instrumented()
+def stream_gemini_response(prompt, title):
+    """
+    Streams a Gemini response into the page under the given heading as chunks arrive.
+    Returns the full text, or None on error. A rerun (e.g. pressing Stop) closes the
+    stream, which cancels the upstream generation.
+    """
+    st.write(f"### {title}")
+    placeholder = st.empty()
+    metrics = {}
+    chunks = []
     try:
-        genai.configure(api_key=API_KEY)
-        response = genai.generate_text(prompt=prompt)
-        return response.result
+        for chunk in get_llm_client(API_KEY).stream(prompt, metrics=metrics):
+            chunks.append(chunk)
+            placeholder.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{''.join(chunks)}</div>", unsafe_allow_html=True)
     except Exception as e:
         st.error(f"Error connecting to Gemini Pro: {e}")
         return None
+    if metrics.get("total_latency") is not None:
+        source = "cache" if metrics["cached"] else ("stream" if metrics["streamed"] else "single response")
+        st.caption(f"First token after {metrics['time_to_first_token'] or 0:.2f}s, completed in {metrics['total_latency']:.2f}s ({source}).")
+    return "".join(chunks) or None
+
+def build_template_prompt(category, template_type, description):
+    return (
+        f"Create a detailed experiment template for the category '{category}' "
+        f"and template type '{template_type}' with the following description: '{description}'."
+    )
+
+@instrumented()
+def generate_template_variants(category, template_types, description, variant_count):
+    """
+    Generates variant_count templates per template type concurrently, rendering each
+    one as soon as it completes.
+    """
+    prompts = []
+    for template_type in template_types:
+        for variant in range(variant_count):
+            prompt = build_template_prompt(category, template_type, description)
+            if variant_count > 1:
+                prompt += f" This is variant {variant + 1} of {variant_count}; make it distinct from the others."
+            prompts.append((template_type, variant + 1, prompt))
+
+    progress = st.progress(0.0, text=f"Generating {len(prompts)} templates...")
+    completed = []
+
+    def on_result(index, prompt, response, error):
+        template_type, variant, _ = prompts[index]
+        completed.append(index)
+        progress.progress(len(completed) / len(prompts), text=f"Generated {len(completed)} of {len(prompts)} templates")
+        with st.expander(f"{template_type} - Variant {variant}", expanded=len(completed) == 1):
+            if error:
+                st.error(f"Error connecting to Gemini Pro: {error}")
+            else:
+                st.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{response}</div>", unsafe_allow_html=True)
+
+    generator = get_async_generator(get_llm_client(API_KEY))
+    results = generator.run_batch([prompt for _, _, prompt in prompts], on_result=on_result)
+    return [
+        (template_type, variant, result)
+        for (template_type, variant, _), result in zip(prompts, results)
+        if not isinstance(result, Exception)
+    ]
 
 def experiment_templates_page():
     st.title("🔬 Experiment Templates")
@@ -30,93 +86,85 @@ def experiment_templates_page():
 
     if st.button("Generate Template"):
         if category and template_type and description:
-            with st.spinner("Generating template..."):
-                prompt = (
-                    f"Create a detailed experiment template for the category '{category}' "
-                    f"and template type '{template_type}' with the following description: '{description}'."
-                )
-                template_content = generate_gemini_response(prompt)
-                if template_content:
-                    st.write("### Generated Template")
-                    st.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{template_content}</div>", unsafe_allow_html=True)
-                    st.session_state.generated_template = template_content
-                else:
-                    st.error("Failed to generate template. Please try again.")
+            prompt = build_template_prompt(category, template_type, description)
+            template_content = stream_gemini_response(prompt, "Generated Template")
+            if template_content:
+                st.session_state.generated_template = template_content
+            else:
+                st.error("Failed to generate template. Please try again.")
         else:
             st.warning("Please fill in all fields to generate a template.")
 
-    if 'template_versions' not in st.session_state:
-        st.session_state['template_versions'] = {}
-    if 'template_comments' not in st.session_state:
-        st.session_state['template_comments'] = {}
+    with st.expander("Generate Multiple Variants"):
+        variant_count = st.number_input("Variants per template type:", min_value=1, max_value=20, value=3)
+        extra_types = st.text_area("Additional template types (one per line, optional):")
+        if st.button("Generate Variants"):
+            if category and template_type and description:
+                template_types = [template_type] + [line.strip() for line in extra_types.splitlines() if line.strip()]
+                variants = generate_template_variants(category, template_types, description, int(variant_count))
+                if variants:
+                    st.session_state.generated_template = variants[0][2]
+                st.success(f"Generated {len(variants)} templates.")
+            else:
+                st.warning("Please fill in all fields to generate a template.")
 
     if 'generated_template' in st.session_state:
+        store = get_template_store()
         st.write("### Save or Modify Template")
         new_template_version = st.text_area("Modify Template:", st.session_state.generated_template)
         st.write("### Template Preview")
         st.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{new_template_version}</div>", unsafe_allow_html=True)
 
-        if template_type not in st.session_state['template_versions']:
-            st.session_state['template_versions'][template_type] = []
-            st.session_state['template_comments'][template_type] = []
-
         if st.button("Save Version"):
-            st.session_state['template_versions'][template_type].append(new_template_version)
+            store.save_version(template_type, new_template_version)
             st.success("Version saved successfully!")
 
         st.write("### Template Versions")
+        head_id = store.head(template_type)
         version_comments = st.text_input("Add a comment for this version:")
         if st.button("Add Comment"):
-            st.session_state['template_comments'][template_type].append(version_comments)
-            st.success("Comment added successfully!")
-
-        for i, (version, comment) in enumerate(zip(st.session_state['template_versions'][template_type], st.session_state['template_comments'][template_type])):
-            st.write(f"**Version {i+1}**:")
-            st.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{version}</div>", unsafe_allow_html=True)
-            st.write(f"**Comment**: {comment}")
-            if st.button(f"Restore Version {i+1}", key=f"restore_{i}"):
-                st.session_state['template_versions'][template_type] = [version]
+            if head_id is None:
+                st.warning("Save a version before adding comments.")
+            elif version_comments.strip():
+                store.add_comment(head_id, version_comments)
+                st.success("Comment added successfully!")
+
+        version_count = store.version_count(template_type)
+        page_count = max(1, -(-version_count // VERSIONS_PER_PAGE))
+        page = st.number_input("Versions page:", min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+        for version in store.list_versions(template_type, page - 1, VERSIONS_PER_PAGE):
+            current = " (current)" if version['id'] == head_id else ""
+            st.write(f"**Version {version['number']}**{current}:")
+            st.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{store.get_text(version['id'])}</div>", unsafe_allow_html=True)
+            for comment in version['comments']:
+                st.write(f"**Comment**: {comment}")
+            if not current and st.button(f"Restore Version {version['number']}", key=f"restore_{version['id']}"):
+                store.restore(template_type, version['id'])
                 st.success("Version restored successfully!")
 
         st.write("### Share or Export Templates")
-        if st.button("Export as TXT"):
-            template_str = '\n'.join(st.session_state['template_versions'][template_type])
-            st.download_button("Download Template (TXT)", template_str, f"{template_type}.txt")
-
-        if st.button("Export as PDF"):
-            buffer = io.BytesIO()
-            c = canvas.Canvas(buffer, pagesize=letter)
-            text = '\n'.join(st.session_state['template_versions'][template_type])
-
-            text_object = c.beginText(50, 750) 
-            text_object.setFont("Helvetica", 12)
-            for line in text.split('\n'):
-                text_object.textLine(line)
-            
-            c.drawText(text_object)
-            c.save()
-
-            buffer.seek(0)
-            st.download_button("Download Template (PDF)", buffer, f"{template_type}.pdf", mime="application/pdf")
+        if head_id is None:
+            st.info("Save a version to export it.")
+        else:
+            st.download_button("Download Template (TXT)", store.export(template_type, "txt"), f"{template_type}.txt")
+            if st.button("Export as PDF"):
+                st.download_button("Download Template (PDF)", store.export(template_type, "pdf"), f"{template_type}.pdf", mime="application/pdf")
 
         uploaded_template = st.file_uploader("Import Template", type="txt")
-        if uploaded_template is not None:
+        if uploaded_template is not None and st.session_state.get('imported_template') != (template_type, uploaded_template.name, uploaded_template.size):
             new_template = uploaded_template.read().decode("utf-8")
-            st.session_state['template_versions'][template_type].append(new_template)
+            store.save_version(template_type, new_template)
+            st.session_state['imported_template'] = (template_type, uploaded_template.name, uploaded_template.size)
             st.success("Template imported successfully!")
 
     st.write("### Generate Personalized Recommendations")
     user_input = st.text_area("Enter experiment details or chemical properties:")
     if st.button("Get Recommendations"):
         if user_input.strip():
-            with st.spinner("Generating recommendations..."):
-                prompt = f"Generate personalized chemical solutions and experimental recommendations based on the following input: {user_input}"
-                recommendations = generate_gemini_response(prompt)
-                if recommendations:
-                    st.write("### Recommendations")
-                    st.markdown(f"<div style='border:1px solid #ddd; padding:10px;'>{recommendations}</div>", unsafe_allow_html=True)
-                else:
-                    st.write("No recommendations found.")
+            prompt = f"Generate personalized chemical solutions and experimental recommendations based on the following input: {user_input}"
+            recommendations = stream_gemini_response(prompt, "Recommendations")
+            if not recommendations:
+                st.write("No recommendations found.")
         else:
             st.warning("Please enter some details to get recommendations.")
 
@@ -1,109 +1,481 @@
 import streamlit as st
 from utils import (
     extract_text_from_pdf, 
+    iter_text_from_pdf,
     generate_wordcloud, 
     analyze_sentiment, 
+    analyze_sentiment_distribution,
     plot_sentiment_analysis, 
+    plot_sentiment_distribution,
     plot_word_frequency, 
+    compute_term_statistics,
     extract_entities, 
     extract_tables_from_pdf
 )
-import fitz
+from cache import SessionCache, get_result_cache, make_key
+from errors import is_error_result
+from corpus import Corpus
+from document import parse_pdf
+from entities import entity_label_counts
+from literature import get_literature_client, page_results
+from llm import get_llm_client
+from metrics import instrumented, span
+from retrieval import build_index, build_prompt
+from spool import SessionBudget, get_upload_spool, session_budget_bytes
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from io import BytesIO
-import re
-import matplotlib.pyplot as plt
+import os
+import threading
+import time
+
+load_dotenv()
+API_KEY = os.getenv("GENIE_API_KEY")
+WORDCLOUD_PREVIEW_SCALE = 4
+RENDER_POLL_SECONDS = 0.5
+LITERATURE_MAX_PAGES = 5
+ASK_MAX_PROMPT_CHARS = 6000
+
+
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+_wordcloud_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="wordcloud")
+_pending_wordclouds = {}
+_pending_lock = threading.Lock()
+
+
+def render_wordcloud(term_stats, wordcloud_params, scale=1):
+    """
+    Lays out the word cloud and returns it as an image array, or the error result.
+    """
+    wordcloud = generate_wordcloud(term_stats, scale=scale, **wordcloud_params)
+    return wordcloud if is_error_result(wordcloud) else wordcloud.to_array()
+
+
+def submit_wordcloud(cache, doc_hash, term_stats, text_params, wordcloud_params):
+    """
+    Starts the full-resolution render on a background thread, once per cache key, and
+    returns (key, future). The thread stores a successful image in the result cache.
+    """
+    key = make_key(doc_hash, "wordcloud", **text_params, **wordcloud_params)
+
+    def render():
+        image = render_wordcloud(term_stats, wordcloud_params)
+        if not is_error_result(image):
+            cache.store("wordcloud", doc_hash, image, **text_params, **wordcloud_params)
+            with _pending_lock:
+                _pending_wordclouds.pop(key, None)
+        return image
+
+    with _pending_lock:
+        future = _pending_wordclouds.get(key)
+        if future is None:
+            future = _pending_wordclouds[key] = _wordcloud_pool.submit(render)
+    return key, future
+
+
+def _await_render(future):
+    if future.done():
+        st.rerun()
+
+
+await_render = _fragment(run_every=RENDER_POLL_SECONDS)(_await_render) if _fragment else None
+
+
+def wordcloud_view(cache, doc_hash, term_stats, text_params, wordcloud_params):
+    """
+    Shows the cached word cloud. On a miss it shows a quick low-resolution preview right
+    away and renders the full image in the background; a polling fragment reruns the
+    page once it is ready, so the layout is never done twice in one rerun.
+    """
+    found, image = cache.lookup("wordcloud", doc_hash, **text_params, **wordcloud_params)
+    if not found:
+        preview = cache.get_or_compute(
+            "wordcloud_preview", doc_hash,
+            lambda: render_wordcloud(term_stats, wordcloud_params, scale=WORDCLOUD_PREVIEW_SCALE),
+            **text_params, **wordcloud_params
+        )
+        if is_error_result(preview):
+            st.error(preview)
+            return
+        key, future = submit_wordcloud(cache, doc_hash, term_stats, text_params, wordcloud_params)
+        if not future.done():
+            st.image(preview, caption="Preview - rendering full resolution...", use_column_width=True)
+            if await_render:
+                await_render(future)
+            else:
+                st.caption("The full-resolution word cloud will appear on the next interaction.")
+            return
+        with _pending_lock:
+            _pending_wordclouds.pop(key, None)
+        image = future.result()
+    if is_error_result(image):
+        st.error(image)
+    else:
+        st.image(image, use_column_width=True)
+
+
+def show_chart(chart):
+    """
+    Displays PNG bytes from the chart renderer, or the error string it returned.
+    """
+    if isinstance(chart, bytes):
+        st.image(chart, use_column_width=True)
+    else:
+        st.error(chart)
+
+
+def spool_upload(uploaded_file):
+    """
+    Spools the upload to disk once per session and returns (path, doc_hash). Later
+    stages open the spooled file by path instead of copying the upload's bytes.
+    """
+    upload_key = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", None))
+    spool = get_upload_spool()
+    spooled = st.session_state.get('spooled_upload')
+    if spooled is None or spooled[0] != upload_key or not os.path.exists(spooled[1]):
+        path, doc_hash = spool.spool(uploaded_file)
+        spooled = st.session_state['spooled_upload'] = (upload_key, path, doc_hash)
+    spool.touch(spooled[1])
+    return spooled[1], spooled[2]
+
+
+def session_cache():
+    """
+    Returns this session's view of the shared result cache, which charges everything
+    the session stores to its memory budget (GENIE_SESSION_MEMORY_MB).
+    """
+    if 'result_cache' not in st.session_state:
+        st.session_state['result_cache'] = SessionCache(get_result_cache(), SessionBudget(session_budget_bytes()))
+    return st.session_state['result_cache']
+
+
+def load_document(path, doc_hash, cache):
+    """
+    Returns the parsed document from the cache, or parses it. The document is stored
+    again on every call so its charge includes an index built since the last rerun.
+    """
+    found, document = cache.lookup("document", doc_hash)
+    if not found:
+        document = stream_document(path, doc_hash)
+    if not cache.store("document", doc_hash, document, persist=False):
+        st.warning("This document is larger than the per-session memory budget, so it is not kept in memory and will be re-read on each interaction.")
+    return document
+
+
+def stream_document(path, doc_hash):
+    """
+    Parses the upload while rendering each page's text and a progress bar as pages arrive.
+    """
+    stream_box = st.empty()
+    with stream_box.container():
+        progress = st.progress(0.0, text="Extracting pages...")
+        page_box = st.container(height=300)
+
+    def on_page(page_number, page_count, text):
+        progress.progress((page_number + 1) / page_count, text=f"Extracted page {page_number + 1} of {page_count}")
+        page_box.text(text)
+
+    document = parse_pdf(path, doc_hash=doc_hash, on_page=on_page)
+    stream_box.empty()
+    return document
+
+
+@instrumented()
+def corpus_view():
+    """
+    Adds each newly uploaded PDF to the session's corpus and shows the most similar
+    pairs and the flagged near-duplicates. Only term counts and MinHash signatures are
+    kept per document, not the parsed pages.
+    """
+    corpus = st.session_state.setdefault('corpus', Corpus())
+    added = st.session_state.setdefault('corpus_uploads', set())
+    generation = st.session_state.setdefault('corpus_generation', 0)
+    uploaded_files = st.file_uploader(
+        "Choose PDF files", type="pdf", accept_multiple_files=True, key=f"corpus_uploader_{generation}"
+    )
+    spool = get_upload_spool()
+    for uploaded_file in uploaded_files or []:
+        upload_key = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", None))
+        if upload_key in added:
+            continue
+        try:
+            with span("pdf_processing.corpus_add", bytes=uploaded_file.size):
+                path, doc_hash = spool.spool(uploaded_file)
+                if doc_hash in corpus:
+                    st.info(f"{uploaded_file.name} is identical to {corpus.names[doc_hash]}.")
+                else:
+                    document = parse_pdf(path, doc_hash=doc_hash)
+                    for other_id, jaccard in corpus.add(doc_hash, uploaded_file.name, "\n".join(document.page_texts)):
+                        st.warning(f"{uploaded_file.name} looks like a near-duplicate of {corpus.names[other_id]} (estimated Jaccard {jaccard:.2f}).")
+        except Exception as e:
+            st.error(f"Error adding {uploaded_file.name} to the corpus: {e}")
+            continue
+        added.add(upload_key)
+
+    if len(corpus) == 0:
+        st.write("Upload PDFs to build a corpus.")
+        return
+    st.write(f"### Corpus ({len(corpus)} documents)")
+    if st.button("Clear Corpus"):
+        del st.session_state['corpus']
+        del st.session_state['corpus_uploads']
+        st.session_state['corpus_generation'] += 1
+        st.rerun()
+
+    st.write("### Most Similar Pairs")
+    pair_count = st.slider("Pairs", 1, 50, 10)
+    st.dataframe(corpus.similar_pairs(pair_count), use_container_width=True)
+
+    st.write("### Near-Duplicates")
+    duplicates = corpus.duplicate_frame()
+    if duplicates.empty:
+        st.write("No near-duplicates found.")
+    else:
+        st.dataframe(duplicates, use_container_width=True)
+
+    st.write("### Similar Documents")
+    selected = st.selectbox("Document", corpus.doc_ids, format_func=lambda doc_id: corpus.names[doc_id])
+    similar = pd.DataFrame(
+        [(corpus.names[other_id], score) for other_id, score in corpus.similar(selected, k=5)],
+        columns=["document", "similarity"],
+    )
+    st.dataframe(similar, use_container_width=True)
+
+
+@instrumented()
+def ask_paper_view(document, doc_hash, cache, pages):
+    """
+    Answers a question about the document from its most relevant chunks only, retrieved
+    from a per-document index cached by hash, and reports prompt size and latency.
+    """
+    st.write("### Ask the Paper")
+    question = st.text_input("Ask a question about this paper:")
+    top_k = st.slider("Excerpts to send", 1, 10, 4)
+    if not question.strip():
+        return
+
+    started = time.perf_counter()
+    index = cache.get_or_compute("retrieval_index", doc_hash, lambda: build_index(document))
+    hits = index.search(question, k=top_k, pages=pages)
+    retrieval_seconds = time.perf_counter() - started
+    if not hits:
+        st.write("No passages in the selected pages match the question.")
+        return
+    prompt, used = build_prompt(question, hits, max_chars=ASK_MAX_PROMPT_CHARS)
+
+    placeholder = st.empty()
+    metrics = {}
+    chunks = []
+    try:
+        for chunk in get_llm_client(API_KEY).stream(prompt, metrics=metrics):
+            chunks.append(chunk)
+            placeholder.markdown("".join(chunks))
+    except Exception as e:
+        st.error(f"Error generating response: {e}")
+        return
+    full_text = sum(len(text) for text in document.page_texts)
+    st.caption(
+        f"Prompt: {len(prompt):,} characters from {used} of {len(index)} excerpts "
+        f"({len(prompt) / max(full_text, 1):.1%} of the document text). "
+        f"Retrieval {retrieval_seconds * 1000:.0f} ms, first token after {metrics.get('time_to_first_token') or 0:.2f}s, "
+        f"completed in {metrics.get('total_latency') or 0:.2f}s{' (cached)' if metrics.get('cached') else ''}."
+    )
+    with st.expander("Excerpts sent"):
+        for chunk, score in hits[:used]:
+            st.markdown(f"**Page {chunk['page'] + 1}{' - ' + chunk['section'] if chunk['section'] else ''}** (score {score:.2f})")
+            st.text(chunk['text'])
+
+
+@instrumented()
+def literature_view():
+    """
+    Searches the literature API and renders result pages as they arrive; for several
+    comma-separated queries the first pages are fetched concurrently.
+    """
+    st.write("### Literature Search")
+    query_text = st.text_input("Search the literature (comma-separate several queries):")
+    queries = [query.strip() for query in query_text.split(",") if query.strip()]
+    if not queries:
+        return
+    client = get_literature_client()
+    if len(queries) == 1:
+        max_pages = st.slider("Result pages", 1, 20, LITERATURE_MAX_PAGES)
+        try:
+            for page, results in client.iter_pages(queries[0], max_pages=max_pages):
+                st.write(f"#### Page {page}")
+                if results:
+                    st.dataframe(pd.DataFrame(results), use_container_width=True)
+                else:
+                    st.write("No results.")
+        except Exception as e:
+            st.error(f"Error searching literature: {e}")
+        return
+    for query, _, data, error in client.search_many((query, 1) for query in queries):
+        st.write(f"#### {query}")
+        if error is not None:
+            st.error(f"Error searching literature: {error}")
+            continue
+        results = page_results(data)
+        if results:
+            st.dataframe(pd.DataFrame(results), use_container_width=True)
+        else:
+            st.write("No results.")
 
 
 def pdf_processing_page():
     st.title("📁 PDF Processing")
 
+    mode = st.radio("Mode", ["Single document", "Corpus"], horizontal=True)
+    if mode == "Corpus":
+        corpus_view()
+        literature_view()
+        return
+
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
     if uploaded_file is not None:
-        file_bytes = uploaded_file.getvalue()
-        pdf_stream = BytesIO(file_bytes)
+        path, doc_hash = spool_upload(uploaded_file)
+        cache = session_cache()
 
         st.write("### PDF Metadata")
+        document = None
         try:
-            with fitz.open(stream=file_bytes, filetype="pdf") as pdf:
-                pdf_metadata = pdf.metadata
-                st.write(f"**Title:** {pdf_metadata.get('title', 'N/A')}")
-                st.write(f"**Author:** {pdf_metadata.get('author', 'N/A')}")
-                st.write(f"**Creation Date:** {pdf_metadata.get('creationDate', 'N/A')}")
-                st.write(f"**Number of Pages:** {pdf.page_count}")
+            with span("pdf_processing.parse", bytes=uploaded_file.size):
+                document = load_document(path, doc_hash, cache)
+            pdf_metadata = document.metadata
+            st.write(f"**Title:** {pdf_metadata.get('title', 'N/A')}")
+            st.write(f"**Author:** {pdf_metadata.get('author', 'N/A')}")
+            st.write(f"**Creation Date:** {pdf_metadata.get('creationDate', 'N/A')}")
+            st.write(f"**Number of Pages:** {document.page_count}")
 
         except Exception as e:
             st.error(f"Error retrieving PDF metadata: {e}")
 
-        page_range = st.text_input("Enter page range (e.g., 1-3) or leave empty for all pages:")
-        keywords = st.text_input("Search Keywords (comma-separated):")
+        if document is not None:
+            page_range = st.text_input("Enter page range (e.g., 1-3) or leave empty for all pages:")
+            keywords = st.text_input("Search Keywords (comma-separated):")
 
-        try:
-            keyword_list = [k.strip() for k in keywords.split(',')] if keywords else None
-            start_page, end_page = (None, None)
-            if page_range:
-                start_page, end_page = map(int, page_range.split('-'))
-
-            file_stream = BytesIO(uploaded_file.read())
-
-            pdf_text = extract_text_from_pdf(file_stream, keywords=keyword_list, start_page=start_page, end_page=end_page)
-            if pdf_text:
-                st.text_area("PDF Content", pdf_text, height=300)
-
-                st.write("### Word Cloud")
-                wordcloud_max_words = st.slider("Max Words", 10, 200, 100)
-                wordcloud_width = st.slider("Width", 400, 800, 600)
-                wordcloud_height = st.slider("Height", 400, 800, 400)
-                wordcloud = generate_wordcloud(pdf_text, max_words=wordcloud_max_words, width=wordcloud_width, height=wordcloud_height)
-                st.image(wordcloud.to_array(), use_column_width=True)
-
-                st.write("### Sentiment Analysis")
-                sentiment_scores = analyze_sentiment(pdf_text)
-                sentiment_plot = plot_sentiment_analysis(sentiment_scores)
-                if isinstance(sentiment_plot, plt.Figure):
-                    st.pyplot(sentiment_plot)
-
-                st.write("### Word Frequency")
-                word_freq_plot = plot_word_frequency(pdf_text)
-                if isinstance(word_freq_plot, plt.Figure):
-                    st.pyplot(word_freq_plot)
-
-                st.write("### Entity Recognition")
-                entities = extract_entities(pdf_text)
-                st.dataframe(entities)
-
-                st.write("### Extracted Tables")
-                file_stream.seek(0)  
-                tables = extract_tables_from_pdf(file_stream)
-                if tables:
-                    for i, table in enumerate(tables):
-                        st.write(f"Table {i+1}")
-                        if isinstance(table, pd.DataFrame):  
-                            st.dataframe(table)
-                            st.download_button("Download Table as CSV", table.to_csv(), file_name=f"table_{i+1}.csv", mime="text/csv")
+            try:
+                keyword_list = [k.strip() for k in keywords.split(',')] if keywords else None
+                start_page, end_page = (None, None)
+                if page_range:
+                    start_page, end_page = map(int, page_range.split('-'))
+
+                text_params = {"keywords": keyword_list, "start_page": start_page, "end_page": end_page}
+
+                with span("pdf_processing.text"):
+                    pdf_text = cache.get_or_compute(
+                        "text", doc_hash,
+                        lambda: extract_text_from_pdf(document, **text_params),
+                        **text_params
+                    )
+                if is_error_result(pdf_text):
+                    st.warning(pdf_text)
+                elif pdf_text:
+                    st.text_area("PDF Content", pdf_text, height=300)
+
+                    with span("pdf_processing.terms"):
+                        term_stats = cache.get_or_compute(
+                            "terms", doc_hash,
+                            lambda: compute_term_statistics(iter_text_from_pdf(document, **text_params)),
+                            **text_params
+                        )
+
+                    with span("pdf_processing.wordcloud"):
+                        st.write("### Word Cloud")
+                        wordcloud_max_words = st.slider("Max Words", 10, 200, 100)
+                        wordcloud_width = st.slider("Width", 400, 800, 600)
+                        wordcloud_height = st.slider("Height", 400, 800, 400)
+                        wordcloud_params = {"max_words": wordcloud_max_words, "width": wordcloud_width, "height": wordcloud_height}
+                        wordcloud_view(cache, doc_hash, term_stats, text_params, wordcloud_params)
+
+                    with span("pdf_processing.sentiment"):
+                        st.write("### Sentiment Analysis")
+                        sentiment_distribution = cache.get_or_compute(
+                            "sentiment", doc_hash,
+                            lambda: analyze_sentiment_distribution(iter_text_from_pdf(document, **text_params), by="sentence"),
+                            **text_params
+                        )
+                        if is_error_result(sentiment_distribution):
+                            st.error(sentiment_distribution)
                         else:
-                            st.write("Invalid table format.")
-                else:
-                    st.write("No tables found.")
-
-                st.write("### Download Processed Text")
-                if st.button("Download Text"):
-                    buffer = BytesIO()
-                    buffer.write(pdf_text.encode())
-                    buffer.seek(0)
-                    st.download_button("Download Text File", buffer, file_name="processed_text.txt", mime="text/plain")
+                            sentiment_scores = analyze_sentiment(sentiment_distribution)
+                            show_chart(plot_sentiment_analysis(sentiment_scores))
+                            show_chart(plot_sentiment_distribution(sentiment_distribution))
+
+                    with span("pdf_processing.word_frequency"):
+                        st.write("### Word Frequency")
+                        show_chart(plot_word_frequency(term_stats))
+
+                    with span("pdf_processing.entities"):
+                        st.write("### Entity Recognition")
+                        entities = cache.get_or_compute(
+                            "entities", doc_hash,
+                            lambda: extract_entities(iter_text_from_pdf(document, **text_params)),
+                            **text_params
+                        )
+                        if isinstance(entities, pd.DataFrame):
+                            st.dataframe(entities, use_container_width=True)
+                            st.write("#### Entities by Type")
+                            st.dataframe(entity_label_counts(entities), use_container_width=True)
+                        else:
+                            st.error(entities)
+
+                    with span("pdf_processing.tables"):
+                        st.write("### Extracted Tables")
+                        tables = cache.get_or_compute("tables", doc_hash, lambda: extract_tables_from_pdf(document))
+                        if is_error_result(tables):
+                            st.error(tables)
+                        elif tables:
+                            for i, table in enumerate(tables):
+                                if isinstance(table, pd.DataFrame):  
+                                    x0, top, x1, bottom = table.attrs.get("bbox", (0, 0, 0, 0))
+                                    st.write(f"Table {i+1} (page {table.attrs.get('page', '?')}, bbox {x0:.0f}, {top:.0f}, {x1:.0f}, {bottom:.0f})")
+                                    st.dataframe(table)
+                                    st.download_button(
+                                        "Download Table as CSV", table.to_csv(index=False),
+                                        file_name=f"table_{i+1}_page_{table.attrs.get('page', 0)}.csv", mime="text/csv", key=f"table_csv_{i}"
+                                    )
+                                else:
+                                    st.write(f"Table {i+1}")
+                                    st.write("Invalid table format.")
+                        else:
+                            st.write("No tables found.")
+
+                    st.write("### Download Processed Text")
+                    if st.button("Download Text"):
+                        st.download_button("Download Text File", pdf_text, file_name="processed_text.txt", mime="text/plain")
                     
-                st.write("### Search and Highlight Text")
-                search_term = st.text_input("Search within the extracted text:")
-                if search_term:
-                    highlighted_text = re.sub(re.escape(search_term), f"**{search_term}**", pdf_text, flags=re.IGNORECASE)
-                    st.text_area("Highlighted Text", highlighted_text, height=300)
+                    with span("pdf_processing.search"):
+                        st.write("### Search and Highlight Text")
+                        search_term = st.text_input('Search within the extracted text (use "quotes" for phrases):')
+                        search_mode = st.radio("Match", ["All terms", "Any term"], horizontal=True)
+                        if search_term:
+                            hits = document.index.query(
+                                search_term,
+                                mode="and" if search_mode == "All terms" else "or",
+                                pages=document.page_range(start_page, end_page)
+                            )
+                            if hits:
+                                hit_count = sum(len(page_hits) for page_hits in hits.values())
+                                st.write(f"Found {hit_count} matches on {len(hits)} pages.")
+                                for page_number, snippet in document.index.snippets(hits):
+                                    st.markdown(f"**Page {page_number + 1}:** {snippet}")
+                            else:
+                                st.write("No matches found.")
 
-            else:
-                st.write("No text extracted from the PDF.")
+                    with span("pdf_processing.ask"):
+                        ask_paper_view(document, doc_hash, cache, document.page_range(start_page, end_page))
 
-        except Exception as e:
-            st.error(f"Error processing PDF: {e}")
+                else:
+                    st.write("No text extracted from the PDF.")
+
+            except Exception as e:
+                st.error(f"Error processing PDF: {e}")
+
+    literature_view()
+
+    with st.expander("Cache Statistics"):
+        st.json(session_cache().stats())
 
     st.write("### Interactive PDF Viewer")
     if uploaded_file is not None:
@@ -1,32 +1,186 @@
 import streamlit as st
-import datetime
+import os
 from io import StringIO
-from docx import Document
+from blob_store import get_blob_store, preview_kind
+from chat_store import get_chat_store, parse_mentions
+from metrics import instrumented
+from notifications import get_notifier
+
+CHAT_POLL_SECONDS = float(os.getenv("GENIE_CHAT_POLL_SECONDS", "2"))
+CHAT_PAGE_SIZE = int(os.getenv("GENIE_CHAT_PAGE_SIZE", "50"))
+SEARCH_PAGE_SIZE = 20
+PREVIEW_WAIT_SECONDS = 5
+
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+def live_fragment(func):
+    """
+    Reruns only the decorated view every CHAT_POLL_SECONDS when Streamlit supports fragments.
+    """
+    return _fragment(run_every=CHAT_POLL_SECONDS)(func) if _fragment else func
+
+
+def sync_messages(store):
+    """
+    Appends messages newer than this session's cursor to its window of the chat and
+    drops the oldest ones beyond the window size; they can be paged back in from the store.
+    """
+    while True:
+        new_messages = store.fetch_since(st.session_state['chat_cursor'])
+        if not new_messages:
+            break
+        st.session_state['chat_history'].extend(new_messages)
+        st.session_state['chat_cursor'] = new_messages[-1]['id']
+    del st.session_state['chat_history'][:-st.session_state['chat_window']]
+
+
+def load_older_messages(store):
+    """
+    Prepends the page of messages preceding the oldest one in the window and grows the window.
+    """
+    history = st.session_state['chat_history']
+    older = store.fetch_before(history[0]['id'] if history else None, CHAT_PAGE_SIZE)
+    if len(older) < CHAT_PAGE_SIZE:
+        st.session_state['chat_at_start'] = True
+    st.session_state['chat_history'] = older + history
+    st.session_state['chat_window'] += len(older)
+
+
+@live_fragment
+@instrumented()
+def chat_history_view():
+    store = get_chat_store()
+    if not st.session_state['chat_at_start'] and st.button("Load older messages"):
+        load_older_messages(store)
+    sync_messages(store)
+    if st.session_state['chat_window'] > CHAT_PAGE_SIZE and st.button("Show latest only"):
+        st.session_state['chat_window'] = CHAT_PAGE_SIZE
+        st.session_state['chat_at_start'] = False
+        sync_messages(store)
+
+    for entry in st.session_state['chat_history']:
+        avatar = store.get_avatar(entry['user'])
+        if avatar:
+            st.image(avatar, width=50)
+        message_display = f"**{entry['timestamp']} - {entry['user']}**: {entry['message']}"
+        if entry['mentions']:
+            mention_list = ', '.join([f"@{mention}" for mention in entry['mentions']])
+            message_display += f" [Mentions: {mention_list}]"
+        st.write(message_display)
+
+
+def notify_mentions(store, user_name, message, mentions):
+    """
+    Queues an email for each mentioned user with a registered address. Sending happens
+    on the notifier's background thread, so posting a message never waits on SMTP.
+    """
+    notifier = get_notifier()
+    if notifier is None or not mentions:
+        return
+    for name, email in store.get_emails(mentions).items():
+        if name.lower() != user_name.lower():
+            notifier.enqueue(email, f"{user_name} mentioned you in Research Genie", message)
+
+
+@instrumented()
+def search_view(store, users):
+    """
+    Filters the full history by mention, author and keywords through the store's
+    indexes, showing one page of results at a time. The first page is queried on every
+    rerun so new matching messages show up; pages loaded with "More results" are kept
+    until the filter changes or a new message arrives.
+    """
+    col1, col2, col3 = st.columns(3)
+    mention_filter = col1.text_input("Filter by mention (e.g., @john):")
+    author_filter = col2.selectbox("Filter by author:", [""] + users)
+    keyword_filter = col3.text_input("Search messages:")
+    if not (mention_filter or author_filter or keyword_filter.strip()):
+        return
+
+    latest_id = store.latest_id()
+    results, cursor = store.search(mention_filter, author_filter, keyword_filter, before_id=latest_id + 1, limit=SEARCH_PAGE_SIZE)
+    search_key = (mention_filter, author_filter, keyword_filter, latest_id)
+    more = st.session_state.get('chat_search')
+    if not more or more['key'] != search_key:
+        more = st.session_state['chat_search'] = {"key": search_key, "results": [], "cursor": cursor}
+
+    if more['cursor'] is not None and st.button("More results"):
+        page, more['cursor'] = store.search(mention_filter, author_filter, keyword_filter, before_id=more['cursor'], limit=SEARCH_PAGE_SIZE)
+        more['results'].extend(page)
+
+    results += more['results']
+    if results:
+        st.write("### Filtered Messages")
+        for entry in results:
+            st.write(f"**{entry['timestamp']} - {entry['user']}**: {entry['message']}")
+    else:
+        st.write("No messages found for this filter.")
+
+
+@instrumented()
+def show_shared_file(blobs, digest, name, mime):
+    """
+    Shows the cached preview of a shared file, waiting briefly while the background
+    worker builds it the first time.
+    """
+    kind = preview_kind(mime)
+    if kind is None:
+        st.write("File type not supported for preview.")
+        return
+    preview = blobs.preview(digest, kind, wait=PREVIEW_WAIT_SECONDS)
+    if preview is None:
+        st.info("The preview is still being generated and will appear on the next refresh.")
+        return
+    if "error" in preview:
+        st.error(preview["error"])
+    elif kind == "image":
+        st.image(preview["image"], caption=name, use_column_width=True)
+    elif kind == "pdf":
+        st.write(f"PDF uploaded ({preview['pages']} pages). Displaying first page:")
+        st.image(preview["image"], caption=name, use_column_width=True)
+        with open(blobs.path(digest), "rb") as f:
+            st.download_button("Download PDF", f, file_name=name, mime=mime)
+    elif kind == "xlsx":
+        st.write("Excel file content (first rows):")
+        st.dataframe(preview["table"])
+    else:
+        st.write("DOCX file content:" if kind == "docx" else "Text file content:")
+        st.text_area("File Content", preview["text"], height=300 if kind == "docx" else 200)
+
 
 def real_time_collaboration_page():
     st.title("👥 Real-time Collaboration")
+    store = get_chat_store()
 
     if 'chat_history' not in st.session_state:
-        st.session_state['chat_history'] = []
-
-    if 'user_mentions' not in st.session_state:
-        st.session_state['user_mentions'] = []
-
-    if 'users' not in st.session_state:
-        st.session_state['users'] = []
+        latest = store.fetch_before(None, CHAT_PAGE_SIZE)
+        st.session_state['chat_history'] = latest
+        st.session_state['chat_cursor'] = latest[-1]['id'] if latest else 0
+        st.session_state['chat_window'] = CHAT_PAGE_SIZE
+        st.session_state['chat_at_start'] = len(latest) < CHAT_PAGE_SIZE
 
-    if 'user_profiles' not in st.session_state:
-        st.session_state['user_profiles'] = {}
+    if 'shared_files' not in st.session_state:
+        st.session_state['shared_files'] = {}
 
     user_name = st.text_input("Your Name:", "")
     if user_name:
-        if user_name not in st.session_state['users']:
-            st.session_state['users'].append(user_name)
-            st.session_state['user_profiles'][user_name] = {"avatar": None}
+        store.add_user(user_name)
+    users = store.list_users()
+    if users:
+        st.caption(f"Participants: {', '.join(users)}")
 
     avatar_file = st.file_uploader("Upload Profile Picture (optional):", type=["jpg", "png"], key="avatar_uploader")
-    if avatar_file and user_name:
-        st.session_state['user_profiles'][user_name]["avatar"] = avatar_file
+    if avatar_file and user_name and st.session_state.get('avatar_saved') != (user_name, avatar_file.name, avatar_file.size):
+        if not store.set_avatar(user_name, avatar_file.getvalue()):
+            st.warning("Could not read the profile picture.")
+        st.session_state['avatar_saved'] = (user_name, avatar_file.name, avatar_file.size)
+
+    user_email = st.text_input("Your Email (optional, for mention notifications):", "")
+    if user_name and user_email.strip() and st.session_state.get('email_saved') != (user_name, user_email):
+        if not store.set_email(user_name, user_email.strip()):
+            st.warning(f"A different email address is already registered for {user_name}; it was not changed.")
+        st.session_state['email_saved'] = (user_name, user_email)
 
     chat_input = st.text_area("Enter your message:")
 
@@ -36,68 +190,34 @@ def real_time_collaboration_page():
         elif not chat_input:
             st.warning("Message cannot be empty.")
         else:
-            mentions = [word[1:] for word in chat_input.split() if word.startswith('@')]
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            st.session_state['chat_history'].append({"user": user_name, "message": chat_input, "mentions": mentions, "timestamp": timestamp})
-            if mentions:
-                st.session_state['user_mentions'].extend(mentions)
+            mentions = parse_mentions(chat_input)
+            store.post_message(user_name, chat_input, mentions)
+            notify_mentions(store, user_name, chat_input, mentions)
             st.success("Message sent successfully!")
 
     st.write("### Chat History")
-    for entry in st.session_state['chat_history']:
-        user_profile = st.session_state['user_profiles'].get(entry['user'], {})
-        avatar = user_profile.get("avatar")
-        if avatar:
-            st.image(avatar, width=50)
-        message_display = f"**{entry['timestamp']} - {entry['user']}**: {entry['message']}"
-        if entry['mentions']:
-            mention_list = ', '.join([f"@{mention}" for mention in entry['mentions']])
-            message_display += f" [Mentions: {mention_list}]"
-        st.write(message_display)
+    chat_history_view()
 
-    st.write("### Filter by Mentions")
-    mention_filter = st.text_input("Filter by user (e.g., @john):")
-    if mention_filter:
-        filtered_messages = [entry for entry in st.session_state['chat_history'] if mention_filter[1:] in entry['mentions']]
-        if filtered_messages:
-            st.write("### Filtered Messages")
-            for entry in filtered_messages:
-                st.write(f"**{entry['timestamp']} - {entry['user']}**: {entry['message']}")
-        else:
-            st.write("No messages found for this mention.")
+    st.write("### Filter Messages")
+    search_view(store, users)
 
     st.write("### Share Files")
     uploaded_file = st.file_uploader("Choose a file to share:", type=["pdf", "txt", "docx", "jpg", "png", "xlsx"])
     if uploaded_file is not None:
-        st.session_state['chat_history'].append({"user": user_name, "message": f"shared a file: {uploaded_file.name}", "mentions": [], "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        blobs = get_blob_store()
+        shared_key = (uploaded_file.name, uploaded_file.size)
+        digest = st.session_state['shared_files'].get(shared_key)
+        if digest is None:
+            digest = blobs.put(uploaded_file, uploaded_file.name, uploaded_file.type)
+            if digest not in st.session_state['shared_files'].values():
+                store.post_message(user_name or "Anonymous", f"shared a file: {uploaded_file.name}")
+            st.session_state['shared_files'][shared_key] = digest
         st.success(f"File {uploaded_file.name} shared successfully!")
-
-        if uploaded_file.type in ["image/jpeg", "image/png"]:
-            st.image(uploaded_file, caption=uploaded_file.name, use_column_width=True)
-        elif uploaded_file.type in ["application/pdf"]:
-            st.write("PDF uploaded. Displaying first page:")
-            pdf_content = uploaded_file.read()
-            st.download_button("Download PDF", pdf_content, file_name=uploaded_file.name, mime=uploaded_file.type)
-        elif uploaded_file.type in ["text/plain"]:
-            st.write("Text file content:")
-            content = uploaded_file.read().decode("utf-8")
-            st.text_area("File Content", content, height=200)
-        elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            st.write("DOCX file content:")
-            doc = Document(uploaded_file)
-            doc_text = '\n'.join([p.text for p in doc.paragraphs])
-            st.text_area("DOCX Content", doc_text, height=300)
-        elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
-            st.write("Excel file content:")
-            import pandas as pd
-            df = pd.read_excel(uploaded_file)
-            st.dataframe(df)
-        else:
-            st.write("File type not supported for preview.")
+        show_shared_file(blobs, digest, uploaded_file.name, uploaded_file.type)
 
     st.write("### Export Chat History")
     if st.button("Export Chat"):
-        chat_history_str = '\n'.join([f"{entry['timestamp']} - {entry['user']}: {entry['message']}" for entry in st.session_state['chat_history']])
+        chat_history_str = '\n'.join([f"{entry['timestamp']} - {entry['user']}: {entry['message']}" for entry in store.iter_messages()])
         buffer = StringIO()
         buffer.write(chat_history_str)
         buffer.seek(0)
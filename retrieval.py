@@ -0,0 +1,181 @@
+import re
+import sys
+import numpy as np
+
+SECTION_NAMES = re.compile(
+    r"^(abstract|introduction|background|related work|methods?|materials and methods|experimental( section)?|"
+    r"results( and discussion)?|discussion|conclusions?|references|acknowledge?ments?|supporting information)$",
+    re.IGNORECASE,
+)
+NUMBERED_HEADING = re.compile(r"^\d{1,2}(\.\d{1,2})*\.?\s+[A-Z][^.!?,;:=()]*$")
+MAX_HEADING_CHARS = 80
+MAX_HEADING_WORDS = 8
+TRAILING_WORDS = {
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "into", "of", "on", "or",
+    "than", "that", "the", "to", "which", "with",
+}
+SENTENCE_VERBS = {"are", "be", "been", "had", "has", "have", "is", "was", "were"}
+
+
+def is_numbered_heading(line):
+    """
+    Returns True for short numbered headings ("2.1 Synthesis of the catalyst"). Lines
+    that read like a wrapped sentence starting with a number (ending mid-phrase or
+    containing "was", "were" and the like) do not count.
+    """
+    if not NUMBERED_HEADING.match(line) or line.endswith("-"):
+        return False
+    words = [word.lower() for word in line.split()[1:]]
+    return (
+        len(words) <= MAX_HEADING_WORDS
+        and words[-1] not in TRAILING_WORDS
+        and not SENTENCE_VERBS.intersection(words)
+    )
+
+
+def is_heading(line):
+    """
+    Returns True for lines that look like section headings: common paper section names,
+    short numbered headings ("2.1 Synthesis") and short all-caps lines.
+    """
+    line = line.strip()
+    if not line or len(line) > MAX_HEADING_CHARS:
+        return False
+    if SECTION_NAMES.match(line.rstrip(":")) or is_numbered_heading(line):
+        return True
+    return line.isupper() and sum(c.isalpha() for c in line) >= 4
+
+
+def _split_line(line, max_chars):
+    while len(line) > max_chars:
+        cut = line.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        yield line[:cut]
+        line = line[cut:].lstrip()
+    yield line
+
+
+def chunk_pages(page_texts, max_chars=1200):
+    """
+    Splits page texts into chunks that never cross a page or section boundary and hold
+    at most about max_chars characters. Returns a list of {"page", "section", "text"}
+    dicts; the current section carries over to the next page.
+    """
+    chunks = []
+    section = ""
+    for page_number, text in enumerate(page_texts):
+        lines = []
+        size = 0
+
+        def flush():
+            body = "\n".join(lines).strip()
+            if body:
+                chunks.append({"page": page_number, "section": section, "text": body})
+            lines.clear()
+
+        for line in text.splitlines():
+            if is_heading(line):
+                flush()
+                size = 0
+                section = line.strip().rstrip(":")
+                continue
+            for piece in _split_line(line, max_chars):
+                if size + len(piece) > max_chars and lines:
+                    flush()
+                    size = 0
+                lines.append(piece)
+                size += len(piece) + 1
+        flush()
+    return chunks
+
+
+class RetrievalIndex:
+    """
+    Local vector index over the chunks of one document. Chunks are hashed into sparse
+    term vectors (no vocabulary to fit), weighted by log term frequency and idf and
+    L2-normalized; a question is scored against every chunk with one sparse product
+    and the best chunks are picked with argpartition.
+    """
+
+    def __init__(self, chunks, n_features=2 ** 18):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.preprocessing import normalize
+
+        self.chunks = chunks
+        self.pages = np.array([chunk["page"] for chunk in chunks], dtype=np.int64)
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, stop_words="english", alternate_sign=False, norm=None
+        )
+        matrix = self.vectorizer.transform(
+            f"{chunk['section']}\n{chunk['text']}" for chunk in chunks
+        ).tocsr().astype(np.float64)
+        df = np.bincount(matrix.indices, minlength=n_features)
+        self.idf = np.log((1 + len(chunks)) / (1 + df)) + 1
+        matrix.data = np.log1p(matrix.data) * self.idf[matrix.indices]
+        self.matrix = normalize(matrix, norm="l2", copy=False)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def memory_size(self):
+        """
+        Returns the approximate bytes held by the matrix, the idf vector and the chunks.
+        """
+        arrays = (self.matrix.data, self.matrix.indices, self.matrix.indptr, self.idf, self.pages)
+        return sum(int(array.nbytes) for array in arrays) + sum(
+            sys.getsizeof(chunk["text"]) + sys.getsizeof(chunk["section"]) for chunk in self.chunks
+        )
+
+    def search(self, question, k=5, pages=None):
+        """
+        Returns up to k (chunk, score) pairs most similar to question, best first.
+        Chunks with no terms in common are left out; pages, when given, restricts the
+        search to those page indices.
+        """
+        from sklearn.preprocessing import normalize
+
+        if not self.chunks:
+            return []
+        query = self.vectorizer.transform([question]).tocsr().astype(np.float64)
+        query.data = np.log1p(query.data) * self.idf[query.indices]
+        query = normalize(query, norm="l2", copy=False)
+        scores = (self.matrix @ query.T).toarray().ravel()
+        if pages is not None:
+            scores[~np.isin(self.pages, list(pages))] = 0.0
+        k = min(k, int(np.count_nonzero(scores > 0)))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunks[i], float(scores[i])) for i in top]
+
+
+def build_index(document, max_chars=1200):
+    """
+    Chunks a ParsedDocument by page and section and indexes the chunks.
+    """
+    return RetrievalIndex(chunk_pages(document.page_texts, max_chars=max_chars))
+
+
+def build_prompt(question, hits, max_chars=6000):
+    """
+    Builds a question-answering prompt from the retrieved chunks, best first, stopping
+    before the excerpts exceed max_chars. Returns (prompt, chunks_used).
+    """
+    excerpts = []
+    used = 0
+    for chunk, _ in hits:
+        label = f"[Page {chunk['page'] + 1}{' - ' + chunk['section'] if chunk['section'] else ''}]"
+        excerpt = f"{label}\n{chunk['text']}"
+        if excerpts and used + len(excerpt) > max_chars:
+            break
+        excerpts.append(excerpt[:max_chars])
+        used += len(excerpt)
+    prompt = (
+        "Answer the question using only the excerpts from the paper below. "
+        "Cite the page numbers you rely on, and say so if the excerpts do not contain the answer.\n\n"
+        + "\n\n".join(excerpts)
+        + f"\n\nQuestion: {question}\nAnswer:"
+    )
+    return prompt, len(excerpts)
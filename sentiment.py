@@ -0,0 +1,85 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from entities import SENTENCE_BOUNDARY
+from loaders import get_sentiment_analyzer
+
+SENTIMENT_FIELDS = ("neg", "neu", "pos", "compound")
+
+
+def _score_chunk(texts):
+    analyzer = get_sentiment_analyzer()
+    scores = np.empty((len(texts), len(SENTIMENT_FIELDS)), dtype=np.float32)
+    for i, text in enumerate(texts):
+        polarity = analyzer.polarity_scores(text)
+        scores[i] = [polarity[field] for field in SENTIMENT_FIELDS]
+    return scores
+
+
+def score_texts(texts, workers=1):
+    """
+    Scores a batch of texts with the process-wide VADER analyzer.
+    Returns an (n, 4) float32 array with columns neg, neu, pos, compound.
+    With more than one worker the batch is split across a process pool.
+    """
+    texts = list(texts)
+    if workers <= 1 or len(texts) < workers * 2:
+        return _score_chunk(texts)
+    chunk_size = -(-len(texts) // (workers * 4))
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(_score_chunk, chunks)))
+
+
+def iter_units(pages, by="page"):
+    """
+    Yields (page_number, text) scoring units: whole pages, or sentences when by="sentence".
+    """
+    for page_number, text in pages:
+        if by == "page":
+            if text.strip():
+                yield page_number, text
+        elif by == "sentence":
+            for sentence in SENTENCE_BOUNDARY.split(text):
+                if sentence.strip():
+                    yield page_number, sentence
+        else:
+            raise ValueError(f"Unknown sentiment unit: {by}")
+
+
+def sentiment_frame(pages, by="page", workers=1):
+    """
+    Scores each page or sentence in one batch and returns a DataFrame with
+    page (1-based), chars and the four VADER scores per unit.
+    """
+    units = list(iter_units(pages, by=by))
+    scores = score_texts([text for _, text in units], workers=workers)
+    frame = pd.DataFrame(scores, columns=SENTIMENT_FIELDS)
+    frame.insert(0, "page", np.fromiter((page_number + 1 for page_number, _ in units), dtype=np.int32, count=len(units)))
+    frame.insert(1, "chars", np.fromiter((len(text) for _, text in units), dtype=np.int32, count=len(units)))
+    return frame
+
+
+def document_sentiment(frame):
+    """
+    Aggregates a sentiment frame into document-level scores, weighting each unit by its length.
+    """
+    if frame.empty:
+        return {field: 0.0 for field in SENTIMENT_FIELDS}
+    weights = frame["chars"].to_numpy(dtype=np.float64)
+    values = frame[list(SENTIMENT_FIELDS)].to_numpy(dtype=np.float64)
+    averages = weights @ values / weights.sum()
+    return {field: round(float(value), 4) for field, value in zip(SENTIMENT_FIELDS, averages)}
+
+
+def page_distribution(frame):
+    """
+    Collapses a sentence-level frame to one length-weighted row per page.
+    """
+    weighted = frame[list(SENTIMENT_FIELDS)].mul(frame["chars"], axis=0)
+    weighted["chars"] = frame["chars"]
+    weighted["page"] = frame["page"]
+    totals = weighted.groupby("page").sum()
+    result = totals[list(SENTIMENT_FIELDS)].div(totals["chars"], axis=0)
+    result.insert(0, "chars", totals["chars"])
+    return result.reset_index()
@@ -0,0 +1,167 @@
+import functools
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), "genie-spool")
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(fileobj, chunk_size=CHUNK_SIZE):
+    """
+    Yields the content of a file-like object in chunks. In-memory uploads are sliced
+    from their buffer without copying; other files are read chunk by chunk.
+    """
+    if hasattr(fileobj, "getbuffer"):
+        view = fileobj.getbuffer()
+        try:
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+        finally:
+            view.release()
+        return
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    yield from iter(lambda: fileobj.read(chunk_size), b"")
+
+
+def stream_to_file(fileobj, directory):
+    """
+    Copies fileobj into a new temporary file in directory while hashing it.
+    Returns (tmp_path, sha256 hex digest); the caller moves or removes the file.
+    """
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter_chunks(fileobj):
+                sha.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, sha.hexdigest()
+
+
+class UploadSpool:
+    """
+    Spools uploads to content-addressed files so PyMuPDF, pdfplumber and worker processes
+    open them by path instead of each holding a copy of the bytes. Identical uploads
+    share one file. When the spool grows beyond max_bytes, the least recently used
+    files are removed.
+    """
+
+    def __init__(self, root, max_bytes=4 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, f"{digest}.pdf")
+
+    def spool(self, fileobj):
+        """
+        Writes fileobj to the spool unless identical content is already there and
+        returns (path, sha256 hex digest).
+        """
+        tmp_path, digest = stream_to_file(fileobj, self.root)
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        self.touch(path)
+        self._evict(keep=path)
+        return path, digest
+
+    def touch(self, path):
+        """
+        Marks a spooled file as recently used.
+        """
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    logging.warning(f"Could not remove spooled upload {path}: {e}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_upload_spool():
+    """
+    Returns the process-wide upload spool at GENIE_SPOOL_DIR, limited to GENIE_SPOOL_MAX_MB.
+    """
+    return UploadSpool(
+        os.getenv("GENIE_SPOOL_DIR", DEFAULT_SPOOL_DIR),
+        max_bytes=int(os.getenv("GENIE_SPOOL_MAX_MB", "4096")) * 1024 * 1024,
+    )
+
+
+class SessionBudget:
+    """
+    Approximate memory a session keeps in the shared result cache, in bytes per cache key,
+    grouped by document hash. Charging a result evicts the session's least recently used
+    other documents until it fits. A result that would take its own document past the
+    whole budget is refused.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.entries = OrderedDict()
+
+    @property
+    def used_bytes(self):
+        return sum(sum(keys.values()) for keys in self.entries.values())
+
+    def charge(self, doc_hash, key, size):
+        """
+        Reserves size bytes for one cached result of a document, replacing an earlier
+        charge for the same key. Returns (admitted, evicted_keys); the caller drops the
+        evicted keys from the cache, including the key itself when a re-measured result
+        no longer fits.
+        """
+        keys = self.entries.setdefault(doc_hash, {})
+        self.entries.move_to_end(doc_hash)
+        previous = keys.pop(key, None)
+        if sum(keys.values()) + size > self.limit_bytes:
+            if not keys:
+                del self.entries[doc_hash]
+            return False, [key] if previous is not None else []
+        evicted = []
+        while self.used_bytes + size > self.limit_bytes:
+            oldest = next(iter(self.entries))
+            evicted.extend(self.entries.pop(oldest))
+        keys[key] = size
+        return True, evicted
+
+    def touch(self, doc_hash):
+        if doc_hash in self.entries:
+            self.entries.move_to_end(doc_hash)
+
+
+def session_budget_bytes():
+    """
+    Returns the per-session memory budget from GENIE_SESSION_MEMORY_MB (default 1024).
+    """
+    return int(os.getenv("GENIE_SESSION_MEMORY_MB", "1024")) * 1024 * 1024
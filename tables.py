@@ -0,0 +1,104 @@
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from document import open_pdf
+
+_worker_source = None
+
+
+def find_candidate_pages(source, min_horizontal=2, min_vertical=2):
+    """
+    Cheap first pass: returns the zero-based pages whose vector drawings contain enough
+    horizontal and vertical rules to form a ruled table. pdfplumber's default table
+    strategy needs the same ruling lines, so pages without them are skipped.
+    """
+    candidates = []
+    with open_pdf(source) as pdf:
+        for page in pdf:
+            horizontal = vertical = 0
+            for drawing in page.get_drawings():
+                for item in drawing["items"]:
+                    if item[0] == "re":
+                        horizontal += 2
+                        vertical += 2
+                    elif item[0] == "l":
+                        start, end = item[1], item[2]
+                        if abs(start.y - end.y) <= 1.0:
+                            horizontal += 1
+                        elif abs(start.x - end.x) <= 1.0:
+                            vertical += 1
+                if horizontal >= min_horizontal and vertical >= min_vertical:
+                    break
+            if horizontal >= min_horizontal and vertical >= min_vertical:
+                candidates.append(page.number)
+    return candidates
+
+
+def _init_worker(source):
+    global _worker_source
+    _worker_source = source
+
+
+def _extract_pages(source, page_numbers):
+    import pdfplumber
+    results = []
+    stream = source if isinstance(source, (str, os.PathLike)) else io.BytesIO(source)
+    with pdfplumber.open(stream, pages=[page_number + 1 for page_number in page_numbers]) as pdf:
+        for page in pdf.pages:
+            for table in page.find_tables():
+                rows = table.extract()
+                if rows:
+                    results.append((page.page_number - 1, tuple(table.bbox), rows))
+    return results
+
+
+def _extract_chunk(page_numbers):
+    return _extract_pages(_worker_source, page_numbers)
+
+
+def table_to_frame(rows, page_number, bbox):
+    """
+    Converts extracted rows to a DataFrame, using the first row as the header when it is
+    complete and unique and converting fully numeric columns. The 1-based page and the
+    table's bounding box are kept in DataFrame.attrs.
+    """
+    header = rows[0]
+    if len(rows) > 1 and all(header) and len(set(header)) == len(header):
+        frame = pd.DataFrame(rows[1:], columns=header)
+    else:
+        frame = pd.DataFrame(rows, columns=[f"Column {i + 1}" for i in range(len(header))])
+
+    for column in frame.columns:
+        values = frame[column].astype("string").str.strip()
+        numeric = pd.to_numeric(values.str.replace(",", "", regex=False), errors="coerce")
+        filled = values.fillna("") != ""
+        if filled.any() and numeric[filled].notna().all():
+            frame[column] = numeric
+    frame.attrs["page"] = page_number + 1
+    frame.attrs["bbox"] = bbox
+    return frame
+
+
+def extract_table_frames(source, workers=1, candidate_pages=None):
+    """
+    Finds candidate pages with the cheap PyMuPDF pass, runs pdfplumber only on those
+    pages (in a process pool when workers > 1) and returns DataFrames in page order.
+    source is a PDF path or bytes.
+    """
+    if candidate_pages is None:
+        candidate_pages = find_candidate_pages(source)
+    if not candidate_pages:
+        return []
+
+    if workers > 1 and len(candidate_pages) > 1:
+        chunk_size = -(-len(candidate_pages) // workers)
+        chunks = [candidate_pages[i:i + chunk_size] for i in range(0, len(candidate_pages), chunk_size)]
+        with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker, initargs=(source,)) as pool:
+            tables = [table for chunk in pool.map(_extract_chunk, chunks) for table in chunk]
+    else:
+        tables = _extract_pages(source, candidate_pages)
+
+    logging.info(f"Extracted {len(tables)} tables from {len(candidate_pages)} candidate pages.")
+    return [table_to_frame(rows, page_number, bbox) for page_number, bbox, rows in tables]
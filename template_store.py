@@ -0,0 +1,280 @@
+import datetime
+import difflib
+import functools
+import io
+import json
+import os
+import zlib
+from cache import ResultCache
+from sqlite_store import SQLiteStore
+
+DEFAULT_TEMPLATE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "templates.sqlite3")
+SNAPSHOT_INTERVAL = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    template_type TEXT PRIMARY KEY,
+    head_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS template_versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    template_type TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    parent_id INTEGER,
+    depth INTEGER NOT NULL,
+    is_snapshot INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    created_at TEXT NOT NULL,
+    UNIQUE (template_type, number)
+);
+CREATE TABLE IF NOT EXISTS template_comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version_id INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS template_comments_by_version ON template_comments (version_id, id);
+CREATE TABLE IF NOT EXISTS template_exports (
+    version_id INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (version_id, format)
+) WITHOUT ROWID;
+"""
+
+
+def make_delta(parent, text):
+    """
+    Encodes text as line operations against parent: ["=", start, end] copies parent
+    lines and ["+", lines] inserts new ones.
+    """
+    parent_lines = parent.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    delta = []
+    matcher = difflib.SequenceMatcher(None, parent_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append(["=", i1, i2])
+        elif j2 > j1:
+            delta.append(["+", lines[j1:j2]])
+    return delta
+
+
+def apply_delta(parent, delta):
+    """
+    Rebuilds a text from its parent and a delta made by make_delta.
+    """
+    parent_lines = parent.splitlines(keepends=True)
+    parts = []
+    for op in delta:
+        if op[0] == "=":
+            parts.extend(parent_lines[op[1]:op[2]])
+        else:
+            parts.extend(op[1])
+    return "".join(parts)
+
+
+def render_text_pdf(text, title=None):
+    """
+    Renders plain text as a letter-size PDF, wrapping long lines and starting a new
+    page whenever the current one is full.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+
+    font, size, leading, margin = "Helvetica", 12, 15, 50
+    width, height = letter
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    if title:
+        c.setTitle(title)
+
+    text_object = None
+    for paragraph in text.split("\n"):
+        for line in simpleSplit(paragraph, font, size, width - 2 * margin) or [""]:
+            if text_object is None or text_object.getY() - leading < margin:
+                if text_object is not None:
+                    c.drawText(text_object)
+                    c.showPage()
+                text_object = c.beginText(margin, height - margin)
+                text_object.setFont(font, size, leading)
+            text_object.textLine(line)
+    if text_object is not None:
+        c.drawText(text_object)
+    c.save()
+    return buffer.getvalue()
+
+
+class TemplateStore(SQLiteStore):
+    """
+    Persistent version history of experiment templates, keyed by template type. Each
+    version is stored zlib-compressed as a line delta against its parent, with a full
+    snapshot every SNAPSHOT_INTERVAL versions along a chain, so rebuilding any version
+    applies at most that many deltas. Every template type has a head pointer: saving
+    creates a child of the head and restoring just moves the pointer, keeping history.
+    Exports are cached per version, which never changes once written.
+    """
+
+    def __init__(self, path, cache_size=64):
+        super().__init__(path, SCHEMA)
+        self._texts = ResultCache(max_items=cache_size)
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _row(self, version_id):
+        return self._connection().execute(
+            "SELECT id, parent_id, depth, is_snapshot, data FROM template_versions WHERE id = ?", (version_id,)
+        ).fetchone()
+
+    def head(self, template_type):
+        """
+        Returns the id of the current version of a template type, or None.
+        """
+        row = self._connection().execute(
+            "SELECT head_id FROM templates WHERE template_type = ?", (template_type,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_text(self, version_id):
+        """
+        Returns the full text of a version, rebuilt from the nearest snapshot.
+        """
+        key = str(version_id)
+        found, text = self._texts.get(key, stage="template_text")
+        if found:
+            return text
+
+        chain = []
+        row = self._row(version_id)
+        while not row["is_snapshot"]:
+            chain.append(row)
+            row = self._row(row["parent_id"])
+        text = zlib.decompress(row["data"]).decode("utf-8")
+        for row in reversed(chain):
+            text = apply_delta(text, json.loads(zlib.decompress(row["data"])))
+        self._texts.set(key, text)
+        return text
+
+    def save_version(self, template_type, text):
+        """
+        Stores text as a new version whose parent is the current head, moves the head to
+        it and returns its id. Saving the head's own text again returns the head.
+        """
+        head_id = self.head(template_type)
+        parent_text = self.get_text(head_id) if head_id else None
+        if parent_text == text:
+            return head_id
+
+        parent_depth = self._row(head_id)["depth"] if head_id else 0
+        is_snapshot = head_id is None or parent_depth + 1 >= SNAPSHOT_INTERVAL
+        if is_snapshot:
+            depth, payload = 0, text.encode("utf-8")
+        else:
+            depth, payload = parent_depth + 1, json.dumps(make_delta(parent_text, text)).encode("utf-8")
+
+        with self._transaction() as conn:
+            number = conn.execute(
+                "SELECT COALESCE(MAX(number), 0) + 1 FROM template_versions WHERE template_type = ?", (template_type,)
+            ).fetchone()[0]
+            version_id = conn.execute(
+                "INSERT INTO template_versions (template_type, number, parent_id, depth, is_snapshot, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (template_type, number, head_id, depth, int(is_snapshot), zlib.compress(payload), self._now())
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO templates (template_type, head_id) VALUES (?, ?) "
+                "ON CONFLICT (template_type) DO UPDATE SET head_id = excluded.head_id",
+                (template_type, version_id)
+            )
+        self._texts.set(str(version_id), text)
+        return version_id
+
+    def restore(self, template_type, version_id):
+        """
+        Makes an existing version the head of its template type.
+        """
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE templates SET head_id = ? WHERE template_type = ? AND EXISTS "
+                "(SELECT 1 FROM template_versions WHERE id = ? AND template_type = ?)",
+                (version_id, template_type, version_id, template_type)
+            ).rowcount
+        if not updated:
+            raise ValueError(f"Version {version_id} does not belong to template type {template_type}")
+
+    def add_comment(self, version_id, comment):
+        """
+        Attaches a comment to a version.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO template_comments (version_id, comment, created_at) VALUES (?, ?, ?)",
+                (version_id, comment, self._now())
+            )
+
+    def version_count(self, template_type):
+        return self._connection().execute(
+            "SELECT COALESCE(MAX(number), 0) FROM template_versions WHERE template_type = ?", (template_type,)
+        ).fetchone()[0]
+
+    def list_versions(self, template_type, page=0, page_size=10):
+        """
+        Returns one page of versions, newest first, as dicts with id, number, parent_id,
+        created_at and comments. Texts are loaded separately with get_text.
+        """
+        conn = self._connection()
+        highest = self.version_count(template_type) - page * page_size
+        rows = conn.execute(
+            "SELECT id, number, parent_id, created_at FROM template_versions "
+            "WHERE template_type = ? AND number <= ? ORDER BY number DESC LIMIT ?",
+            (template_type, highest, page_size)
+        ).fetchall()
+        versions = [dict(row, comments=[]) for row in rows]
+        if versions:
+            by_id = {version["id"]: version for version in versions}
+            placeholders = ", ".join("?" * len(by_id))
+            for row in conn.execute(
+                f"SELECT version_id, comment FROM template_comments WHERE version_id IN ({placeholders}) ORDER BY id",
+                list(by_id)
+            ):
+                by_id[row["version_id"]]["comments"].append(row["comment"])
+        return versions
+
+    def export(self, template_type, fmt):
+        """
+        Returns the head version exported as "txt" or "pdf" bytes, rendering it only the
+        first time a version is exported in that format. Returns None without versions.
+        """
+        head_id = self.head(template_type)
+        if head_id is None:
+            return None
+        row = self._connection().execute(
+            "SELECT data FROM template_exports WHERE version_id = ? AND format = ?", (head_id, fmt)
+        ).fetchone()
+        if row:
+            return row[0]
+
+        text = self.get_text(head_id)
+        if fmt == "txt":
+            data = text.encode("utf-8")
+        elif fmt == "pdf":
+            data = render_text_pdf(text, title=template_type)
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO template_exports (version_id, format, data) VALUES (?, ?, ?)",
+                (head_id, fmt, data)
+            )
+        return data
+
+
+@functools.lru_cache(maxsize=None)
+def get_template_store(path=None):
+    """
+    Returns the process-wide template store at path, GENIE_TEMPLATE_DB or data/templates.sqlite3.
+    """
+    return TemplateStore(path or os.getenv("GENIE_TEMPLATE_DB", DEFAULT_TEMPLATE_DB))
@@ -0,0 +1,59 @@
+import sys
+import numpy as np
+import pandas as pd
+
+
+class TermStats:
+    """
+    Term frequency table for one document, built from a single tokenization pass.
+    Shared by the word-frequency chart and the word cloud.
+    """
+
+    def __init__(self, terms, counts):
+        self.terms = terms
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.terms)
+
+    def memory_size(self):
+        """
+        Returns the approximate bytes held by the term and count arrays.
+        """
+        return int(self.terms.nbytes + self.counts.nbytes) + sum(sys.getsizeof(term) for term in self.terms)
+
+    def top_k(self, k):
+        """
+        Returns the k most frequent (term, count) pairs, selected with argpartition
+        so only the top k entries are ever sorted.
+        """
+        k = min(k, len(self.counts))
+        if k <= 0:
+            return []
+        top = np.argpartition(self.counts, -k)[-k:]
+        return sorted(((str(self.terms[i]), int(self.counts[i])) for i in top), key=lambda item: (-item[1], item[0]))
+
+    def frequencies(self, max_words=None):
+        """
+        Returns a {term: count} mapping of the most frequent terms, ready for WordCloud.generate_from_frequencies.
+        """
+        return dict(self.top_k(max_words or len(self.counts)))
+
+    def to_frame(self, k=20):
+        """
+        Returns the top k terms as a DataFrame with word and count columns.
+        """
+        return pd.DataFrame(self.top_k(k), columns=["word", "count"])
+
+
+def compute_term_stats(pages, stop_words="english"):
+    """
+    Tokenizes (page_number, text) pairs once with a CountVectorizer and sums the sparse
+    page-term matrix into a frequency table without densifying it.
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    vectorizer = CountVectorizer(stop_words=stop_words)
+    matrix = vectorizer.fit_transform(text for _, text in pages)
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    return TermStats(vectorizer.get_feature_names_out(), counts)
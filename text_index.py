@@ -0,0 +1,162 @@
+import re
+import sys
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# A token costs a (start, end) span tuple with two ints plus a position int, and the
+# list slots pointing at them.
+TOKEN_BYTES = sys.getsizeof((0, 0)) + 3 * sys.getsizeof(2 ** 20) + 2 * 8
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens.
+    """
+    return [match.group().lower() for match in TOKEN_PATTERN.finditer(text)]
+
+
+class InvertedIndex:
+    """
+    Token/position index over the pages of a document. Maps each lowercase term to
+    the pages and token positions where it occurs, and keeps the character span of
+    every token so hits resolve to page offsets without rescanning the text.
+    """
+
+    def __init__(self, page_texts):
+        self.page_texts = page_texts
+        self.postings = {}
+        self.spans = []
+        for page_number, text in enumerate(page_texts):
+            page_spans = []
+            for position, match in enumerate(TOKEN_PATTERN.finditer(text)):
+                page_spans.append(match.span())
+                self.postings.setdefault(match.group().lower(), {}).setdefault(page_number, []).append(position)
+            self.spans.append(page_spans)
+        self._memory_size = None
+
+    def memory_size(self):
+        """
+        Returns the approximate bytes held by the postings and token spans, excluding
+        the page texts themselves.
+        """
+        if self._memory_size is None:
+            tokens = sum(len(page_spans) for page_spans in self.spans)
+            self._memory_size = (
+                sys.getsizeof(self.postings)
+                + sum(sys.getsizeof(term) + sys.getsizeof(pages) for term, pages in self.postings.items())
+                + tokens * TOKEN_BYTES
+            )
+        return self._memory_size
+
+    def term_hits(self, term):
+        """
+        Returns {page_number: [(start, end), ...]} for a single term.
+        """
+        pages = self.postings.get(term.lower(), {})
+        return {page: [self.spans[page][position] for position in positions] for page, positions in pages.items()}
+
+    def phrase_hits(self, phrase):
+        """
+        Returns {page_number: [(start, end), ...]} for consecutive occurrences of the phrase's tokens.
+        """
+        terms = tokenize(phrase)
+        if not terms:
+            return {}
+        if len(terms) == 1:
+            return self.term_hits(terms[0])
+
+        postings = [self.postings.get(term, {}) for term in terms]
+        candidate_pages = set(postings[0]).intersection(*postings[1:])
+        hits = {}
+        for page in candidate_pages:
+            following = [set(term_postings[page]) for term_postings in postings[1:]]
+            page_hits = [
+                (self.spans[page][position][0], self.spans[page][position + len(terms) - 1][1])
+                for position in postings[0][page]
+                if all(position + offset in positions for offset, positions in enumerate(following, start=1))
+            ]
+            if page_hits:
+                hits[page] = page_hits
+        return hits
+
+    def search(self, clauses, mode="and", pages=None):
+        """
+        Combines term or phrase clauses with AND/OR semantics.
+        Returns {page_number: [(start, end), ...]} with hits sorted by offset,
+        optionally restricted to the given pages.
+        """
+        clause_hits = [self.phrase_hits(clause) for clause in clauses if tokenize(clause)]
+        if not clause_hits:
+            return {}
+
+        if mode == "and":
+            matching = set(clause_hits[0]).intersection(*clause_hits[1:])
+        elif mode == "or":
+            matching = set().union(*clause_hits)
+        else:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if pages is not None:
+            matching &= set(pages)
+
+        return {
+            page: sorted(hit for hits in clause_hits for hit in hits.get(page, []))
+            for page in sorted(matching)
+        }
+
+    def query(self, query, mode="and", pages=None):
+        """
+        Runs a free-text query where "quoted text" is a phrase and other words are terms.
+        """
+        phrases = PHRASE_PATTERN.findall(query)
+        terms = tokenize(PHRASE_PATTERN.sub(" ", query))
+        return self.search(phrases + terms, mode=mode, pages=pages)
+
+    def matching_pages(self, keywords, pages=None):
+        """
+        Returns the sorted page numbers whose text contains any of the keywords as a
+        case-insensitive substring, so "learn" matches "learning". A keyword made only of
+        word characters always falls inside a single token, so it is answered by scanning
+        the vocabulary instead of the text; other keywords are looked up in the page text.
+        """
+        allowed = set(range(len(self.page_texts))) if pages is None else set(pages)
+        matching = set()
+        for keyword in keywords:
+            keyword = keyword.lower()
+            if TOKEN_PATTERN.fullmatch(keyword):
+                for term, term_pages in self.postings.items():
+                    if keyword in term:
+                        matching.update(term_pages)
+            elif keyword:
+                matching.update(page for page in allowed - matching if keyword in self.page_texts[page].lower())
+        return sorted(matching & allowed)
+
+    def snippets(self, hits, context=60, max_snippets=50, marker="**"):
+        """
+        Builds highlighted (page_number, snippet) pairs straight from hit offsets.
+        Hits close enough to share a context window are merged into one snippet.
+        """
+        snippets = []
+        for page, page_hits in hits.items():
+            text = self.page_texts[page]
+            i = 0
+            while i < len(page_hits) and len(snippets) < max_snippets:
+                window_start = max(0, page_hits[i][0] - context)
+                window_end = min(len(text), page_hits[i][1] + context)
+                parts = []
+                cursor = window_start
+                while i < len(page_hits) and page_hits[i][0] < window_end:
+                    start, end = page_hits[i]
+                    if start >= cursor:
+                        parts.append(text[cursor:start])
+                        parts.append(f"{marker}{text[start:end]}{marker}")
+                        cursor = end
+                    window_end = min(len(text), max(window_end, end + context))
+                    i += 1
+                parts.append(text[cursor:window_end])
+                snippet = " ".join("".join(parts).split())
+                prefix = "..." if window_start > 0 else ""
+                suffix = "..." if window_end < len(text) else ""
+                snippets.append((page, f"{prefix}{snippet}{suffix}"))
+            if len(snippets) >= max_snippets:
+                break
+        return snippets
@@ -1,229 +1,296 @@
-import fitz
-import google.generativeai as genai
-import requests
-import matplotlib.pyplot as plt
-import io
-from wordcloud import WordCloud
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from nltk.sentiment import SentimentIntensityAnalyzer
-from sklearn.feature_extraction.text import CountVectorizer
-import seaborn as sns
-import pandas as pd
-import spacy
 import logging
-import pdfplumber
-import nltk
-nltk.download('vader_lexicon')
+import os
+from document import ParsedDocument, as_document, iter_pdf_pages
+from errors import ErrorResult, is_error_result
+from llm import get_llm_client
+from loaders import get_nlp
+from metrics import instrumented
 
+# Heavy libraries (Gemini SDK, matplotlib, seaborn, wordcloud, sklearn, spaCy, NLTK)
+# are imported inside the functions that use them so importing utils stays cheap.
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-nlp = spacy.load("en_core_web_sm")
-
+@instrumented()
 def get_gemini_response(prompt, api_key):
     """
     Retrieves a response from Gemini AI using the provided prompt and API key.
+    Responses come from the shared LLM client, which caches and coalesces identical prompts.
     """
     try:
-        genai.configure(api_key=api_key)
-        response = genai.generate_text(prompt=prompt)
-        return response.result
+        return get_llm_client(api_key).generate(prompt)
     except Exception as e:
         logging.error(f"Error generating response from Gemini AI: {e}")
-        return f"Error generating response: {e}"
+        return ErrorResult(f"Error generating response: {e}")
+
+def iter_text_from_pdf(pdf_file, keywords=None, start_page=None, end_page=None):
+    """
+    Yields (page_number, text) pairs from a PDF document as pages are decoded,
+    optionally filtering by keywords and page range.
+    Accepts a ParsedDocument, a file path, raw PDF bytes or a file-like object, which is
+    spooled to disk instead of being read into memory. A page matches when it contains
+    any keyword as a case-insensitive substring, whatever the input type; for a
+    ParsedDocument this is answered from its inverted index. Empty keywords are ignored.
+    """
+    keywords = [keyword for keyword in keywords if keyword] if keywords else None
+    if isinstance(pdf_file, ParsedDocument):
+        if keywords:
+            page_range = pdf_file.page_range(start_page, end_page)
+            for page_number in pdf_file.index.matching_pages(keywords, pages=page_range):
+                yield page_number, pdf_file.page_texts[page_number]
+            return
+        pages = pdf_file.iter_pages(start_page, end_page)
+    else:
+        if start_page and end_page and start_page > end_page:
+            raise ValueError("Start page cannot be greater than end page.")
+        if isinstance(pdf_file, (str, os.PathLike, bytes, bytearray)):
+            source = pdf_file
+        else:
+            from spool import get_upload_spool
+            source, _ = get_upload_spool().spool(pdf_file)
+        pages = iter_pdf_pages(source, start_page, end_page)
+
+    lowered_keywords = [keyword.lower() for keyword in keywords] if keywords else None
+    for page_number, page_text in pages:
+        if lowered_keywords:
+            lowered_text = page_text.lower()
+            if not any(keyword in lowered_text for keyword in lowered_keywords):
+                continue
+        yield page_number, page_text
 
-def extract_text_from_pdf(pdf_file, keywords=None, start_page=None, end_page=None):
+@instrumented()
+def extract_text_from_pdf(pdf_file, keywords=None, start_page=None, end_page=None, workers=None):
     """
-    Extracts text from a PDF file, optionally filtering by keywords and page range.
+    Extracts text from a PDF document, optionally filtering by keywords and page range.
+    Accepts a ParsedDocument, raw PDF bytes or a file-like object; for raw input only
+    the requested pages are decoded, with the given number of worker processes
+    (GENIE_PDF_WORKERS by default).
     """
-    text = ""
     if not pdf_file:
         logging.error("No PDF file provided.")
-        return "Error: No PDF file provided."
+        return ErrorResult("Error: No PDF file provided.")
 
     try:
-        with fitz.open(stream=pdf_file.read(), filetype="pdf") as pdf:
-            num_pages = pdf.page_count
-            start_page = start_page or 0
-            end_page = end_page or num_pages
-            if start_page > end_page:
-                raise ValueError("Start page cannot be greater than end page.")
-
-            for i in range(start_page, min(end_page, num_pages)):
-                page = pdf.load_page(i)
-                page_text = page.get_text()
-                if keywords:
-                    if any(keyword.lower() in page_text.lower() for keyword in keywords):
-                        text += page_text
-                else:
-                    text += page_text
+        document = as_document(pdf_file, workers=workers, start_page=start_page, end_page=end_page)
+        text = "".join(page_text for _, page_text in iter_text_from_pdf(document, keywords, start_page, end_page))
 
         if not text:
             logging.warning("No text extracted from the PDF.")
-            return "Warning: No text extracted from the PDF."
+            return ErrorResult("Warning: No text extracted from the PDF.")
     except Exception as e:
         logging.error(f"Error extracting text from PDF: {e}")
-        return f"Error extracting text from PDF: {e}"
+        return ErrorResult(f"Error extracting text from PDF: {e}")
 
     return text
 
-def generate_wordcloud(text, max_words=100, width=800, height=400):
+@instrumented()
+def generate_wordcloud(text, max_words=100, width=800, height=400, scale=1):
     """
     Generates a word cloud image from the provided text with customizable settings.
+    Accepts text or a TermStats table; the cloud is laid out from term frequencies
+    so the vectorizer's tokenization and stop words apply. A scale above 1 lays the
+    cloud out on a canvas that many times smaller and upscales it when drawing,
+    which gives a fast, lower-resolution preview at the requested size.
     """
     try:
         if not text:
             raise ValueError("No text provided for word cloud generation.")
-        
+
+        from wordcloud import WordCloud
+        term_stats = compute_term_statistics(text)
+        if is_error_result(term_stats):
+            raise ValueError(term_stats)
         wordcloud = WordCloud(
-            width=width, 
-            height=height, 
+            width=max(1, width // scale), 
+            height=max(1, height // scale), 
+            scale=scale,
             background_color='white', 
             max_words=max_words
-        ).generate(text)
+        ).generate_from_frequencies(term_stats.frequencies(max_words))
         
         return wordcloud
     except Exception as e:
         logging.error(f"Error generating word cloud: {e}")
-        return f"Error generating word cloud: {e}"
+        return ErrorResult(f"Error generating word cloud: {e}")
 
-def search_literature(query):
+@instrumented()
+def search_literature(query, page=1):
     """
     Searches for literature based on the provided query using an external API.
+    Requests share a pooled session with timeouts and results are cached for a while.
     """
+    import requests
+    from literature import get_literature_client
     try:
-        response = requests.get(f"https://api.literature-search.com?query={query}")
-        response.raise_for_status()
-        return response.json()
+        return get_literature_client().search(query, page=page)
     except requests.RequestException as e:
         logging.error(f"Error searching literature: {e}")
-        return f"Error searching literature: {e}"
+        return ErrorResult(f"Error searching literature: {e}")
 
+@instrumented()
 def send_email(to_email, subject, message, email_address, email_password):
     """
     Sends an email with the specified subject and message using the provided email credentials.
+    The connection to the configured SMTP server (GENIE_SMTP_HOST/GENIE_SMTP_PORT) is pooled
+    and reused across calls; get_notifier() queues notifications without blocking instead.
     """
     try:
-        msg = MIMEMultipart()
-        msg['From'] = email_address
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(message, 'plain'))
-        
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(email_address, email_password)
-            server.sendmail(email_address, to_email, msg.as_string())
-        
+        from notifications import build_message, get_smtp_pool
+        get_smtp_pool(email_address, email_password).send(build_message(email_address, to_email, subject, message))
         return "Email sent successfully!"
     except Exception as e:
         logging.error(f"Error sending email: {e}")
-        return f"Error sending email: {e}"
+        return ErrorResult(f"Error sending email: {e}")
+
+def _as_pages(text):
+    if isinstance(text, str):
+        return [(0, text)]
+    if isinstance(text, ParsedDocument):
+        return text.iter_pages()
+    return text
 
-def analyze_sentiment(text):
+@instrumented()
+def analyze_sentiment_distribution(text, by="page", workers=1):
     """
-    Analyzes the sentiment of the provided text.
+    Scores the sentiment of each page or sentence in one batch.
+    Accepts a string, a ParsedDocument or an iterable of (page_number, text) pairs
+    and returns a DataFrame with one row per unit.
     """
     try:
         if not text:
             raise ValueError("No text provided for sentiment analysis.")
-        
-        sia = SentimentIntensityAnalyzer()
-        sentiment_scores = sia.polarity_scores(text)
-        return sentiment_scores
+        from sentiment import sentiment_frame
+        return sentiment_frame(_as_pages(text), by=by, workers=workers)
     except Exception as e:
         logging.error(f"Error analyzing sentiment: {e}")
-        return f"Error analyzing sentiment: {e}"
+        return ErrorResult(f"Error analyzing sentiment: {e}")
 
-def extract_entities(text):
+@instrumented()
+def analyze_sentiment(text, by="sentence", workers=1):
+    """
+    Analyzes the sentiment of the provided text.
+    The document-level scores are the length-weighted average of the batch-scored
+    sentences (or pages), or of a DataFrame from analyze_sentiment_distribution.
+    """
+    try:
+        if text is None or (isinstance(text, str) and not text):
+            raise ValueError("No text provided for sentiment analysis.")
+        from sentiment import document_sentiment, sentiment_frame
+        frame = text if hasattr(text, "columns") else sentiment_frame(_as_pages(text), by=by, workers=workers)
+        return document_sentiment(frame)
+    except Exception as e:
+        logging.error(f"Error analyzing sentiment: {e}")
+        return ErrorResult(f"Error analyzing sentiment: {e}")
+
+@instrumented()
+def extract_entities(text, batch_size=32, n_process=1):
     """
     Extracts entities from the provided text using spaCy.
+    Accepts a string, a ParsedDocument or an iterable of (page_number, text) pairs;
+    the text is chunked on page and sentence boundaries and streamed through nlp.pipe
+    into a deduplicated entity table with per-entity counts and first-occurrence pages.
     """
     try:
         if not text:
             raise ValueError("No text provided for entity extraction.")
-        
-        doc = nlp(text)
-        entities = {"Entities": [ent.text for ent in doc.ents], "Type": [ent.label_ for ent in doc.ents]}
-        return pd.DataFrame(entities)
+        from entities import extract_entity_table
+
+        return extract_entity_table(get_nlp(), _as_pages(text), batch_size=batch_size, n_process=n_process)
     except Exception as e:
         logging.error(f"Error extracting entities: {e}")
-        return f"Error extracting entities: {e}"
+        return ErrorResult(f"Error extracting entities: {e}")
 
-def extract_tables_from_pdf(pdf_file):
+@instrumented()
+def extract_tables_from_pdf(pdf_file, workers=None):
     """
-    Extracts tables from a PDF file.
+    Extracts tables from a PDF document as DataFrames, with the 1-based page and the
+    bounding box of each table in DataFrame.attrs.
+    Accepts a ParsedDocument, raw PDF bytes or a file-like object.
     """
     try:
-        tables = []
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                tables.extend(page.extract_tables())
-        return tables
+        document = as_document(pdf_file)
+        return document.table_frames(workers=workers)
     except Exception as e:
         logging.error(f"Error extracting tables from PDF: {e}")
-        return f"Error extracting tables from PDF: {e}"
+        return ErrorResult(f"Error extracting tables from PDF: {e}")
 
 
-def plot_sentiment_analysis(sentiment_scores):
+@instrumented()
+def plot_sentiment_analysis(sentiment_scores, output="png"):
     """
     Plots sentiment analysis results as a bar chart.
+    Given a DataFrame from analyze_sentiment_distribution, plots the per-page distribution instead.
+    Returns PNG bytes (cached per data and size) or, with output="figure", a Figure.
     """
+    if hasattr(sentiment_scores, "columns"):
+        return plot_sentiment_distribution(sentiment_scores, output=output)
     try:
         if not sentiment_scores or not isinstance(sentiment_scores, dict):
             raise ValueError("Invalid sentiment scores provided.")
+        from charts import draw_sentiment_scores, render_chart
 
-        labels = ['Positive', 'Negative', 'Neutral']
-        scores = [sentiment_scores.get('pos', 0), sentiment_scores.get('neg', 0), sentiment_scores.get('neu', 0)]
-        
-        plt.figure(figsize=(8, 4))
-        plt.bar(labels, scores, color=['green', 'red', 'gray'])
-        plt.title('Sentiment Analysis')
-        plt.xlabel('Sentiment')
-        plt.ylabel('Score')
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+        return render_chart("sentiment", sentiment_scores, draw_sentiment_scores, figsize=(8, 4), output=output)
     except Exception as e:
         logging.error(f"Error plotting sentiment analysis: {e}")
-        return f"Error plotting sentiment analysis: {e}"
+        return ErrorResult(f"Error plotting sentiment analysis: {e}")
+
+@instrumented()
+def plot_sentiment_distribution(sentiment_frame, output="png"):
+    """
+    Plots the per-page compound sentiment with positive and negative shares.
+    """
+    try:
+        if sentiment_frame is None or sentiment_frame.empty:
+            raise ValueError("Invalid sentiment scores provided.")
+        from charts import draw_sentiment_distribution, render_chart
+        from sentiment import page_distribution
+
+        per_page = page_distribution(sentiment_frame)
+        return render_chart("sentiment_distribution", per_page, draw_sentiment_distribution, figsize=(10, 4), output=output)
+    except Exception as e:
+        logging.error(f"Error plotting sentiment distribution: {e}")
+        return ErrorResult(f"Error plotting sentiment distribution: {e}")
 
-def plot_word_frequency(text):
+@instrumented()
+def compute_term_statistics(text):
     """
-    Plots word frequency from the provided text.
+    Builds the term frequency table for a document in a single tokenization pass.
+    Accepts a string, a ParsedDocument, an iterable of (page_number, text) pairs
+    or an existing TermStats, which is returned unchanged.
+    """
+    try:
+        from term_stats import TermStats, compute_term_stats
+        if isinstance(text, TermStats):
+            return text
+        if is_error_result(text):
+            raise ValueError(text)
+        if not text:
+            raise ValueError("No text provided for term statistics.")
+        return compute_term_stats(_as_pages(text))
+    except Exception as e:
+        logging.error(f"Error computing term statistics: {e}")
+        return ErrorResult(f"Error computing term statistics: {e}")
+
+@instrumented()
+def plot_word_frequency(text, top_k=20, output="png"):
+    """
+    Plots word frequency from the provided text or TermStats table.
+    Returns PNG bytes (cached per data and size) or, with output="figure", a Figure.
     """
     try:
         if not text:
             raise ValueError("No text provided for word frequency analysis.")
+        from charts import draw_word_frequency, render_chart
+
+        term_stats = compute_term_statistics(text)
+        if is_error_result(term_stats):
+            raise ValueError(term_stats)
+        word_freq = term_stats.to_frame(top_k)
 
-        vectorizer = CountVectorizer(stop_words='english')
-        word_count = vectorizer.fit_transform([text])
-        word_freq = pd.DataFrame({'word': vectorizer.get_feature_names_out(), 'count': word_count.toarray().sum(axis=0)})
-        word_freq = word_freq.sort_values('count', ascending=False).head(20)
-        
         if word_freq.empty:
             raise ValueError("No words to plot.")
-        
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x='count', y='word', data=word_freq, palette='viridis', hue=None) 
-        plt.title('Word Frequency')
-        plt.xlabel('Count')
-        plt.ylabel('Word')
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-
-        return buf
+
+        return render_chart("word_frequency", word_freq, draw_word_frequency, figsize=(10, 6), output=output)
     except Exception as e:
         logging.error(f"Error plotting word frequency: {e}")
-        return f"Error plotting word frequency: {e}"
+        return ErrorResult(f"Error plotting word frequency: {e}")